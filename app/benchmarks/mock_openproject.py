@@ -0,0 +1,286 @@
+"""Local stand-in for the parts of the OpenProject and open-meteo apis used by the
+scheduler, seeded with synthetic templates and clone history. Used by the
+benchmarks so runs can be measured offline and repeated exactly.
+
+    python benchmarks/mock_openproject.py --port 8089 --projects 10 --templates 500
+"""
+import json
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from aiohttp import web
+
+
+# ————————————————————————— Module Scoped Variables —————————————————————————
+
+ALGORITHMS = ['Fixed Interval', 'Fixed Delay', 'Fixed Day Of Month', 'Fixed Day Of Year', 'Weather Forecast']
+
+# custom fields of the template projects, in customFieldN order
+CUSTOM_FIELDS = ['Auto Scheduling Algorithm', 'Interval/Day Of Month', 'Target Project', 'Weather Conditions', 'Weather Detected Status']
+
+OPEN, CLOSED = 1, 2
+
+
+# ————————————————————————— Models —————————————————————————
+
+class MockOpenProject:
+    """In memory OpenProject instance. Projects 1..N hold the templates and have the
+    scheduling custom fields, clones are created in one extra project without them.
+    Requests and response bytes are counted per route.
+    """
+
+    def __init__(self, projects: int=1, types: int=1, templates: int=10, history: int=5):
+        self.num_projects = projects
+        self.num_types = types
+        self.work_packages: dict[int, dict] = {}
+        self.relations: list[dict] = []
+        self.duplicate_of: dict[int, int] = {}  # clone id to template id
+        self.stats = defaultdict(lambda: {'requests': 0, 'bytes': 0})
+        self._next_id = 1
+        self._version = 0  # bumped on every write, invalidates the filtered results
+        self._filtered: dict[tuple, list[dict]] = {}
+        self.seed(templates, history)
+
+    @property
+    def target_project_id(self) -> int:
+        return self.num_projects + 1
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id - 1
+
+    def _changed(self):
+        self._version += 1
+        self._filtered.clear()
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def work_package(self, id: int, project_id: int, type_id: int, on: str, status_id: int=OPEN, **custom_fields) -> dict:
+        links = {
+            'self': {'href': f'/api/v3/work_packages/{id}'},
+            'project': {'href': f'/api/v3/projects/{project_id}'},
+            'type': {'href': f'/api/v3/types/{type_id}'},
+            'status': {'href': f'/api/v3/statuses/{status_id}'},
+        }
+        data = {
+            'id': id, '_type': 'WorkPackage', 'subject': f'Work package {id}', 'lockVersion': 0,
+            'startDate': on, 'dueDate': on, 'updatedAt': '2026-01-01T00:00:00Z', '_links': links,
+        }
+        for name, value in custom_fields.items():
+            key = f'customField{CUSTOM_FIELDS.index(name) + 1}'
+            if isinstance(value, dict):
+                links[key] = value
+            else:
+                data[key] = value
+        return data
+
+    def seed(self, templates: int, history: int):
+        """Creates the templates, cycling through the algorithms, and history closed
+        clones for each of them spaced one interval apart.
+        """
+        today = date.today()
+        target = {'href': f'/api/v3/projects/{self.target_project_id}', 'title': 'Work'}
+        for i in range(templates):
+            algorithm = ALGORITHMS[i % len(ALGORITHMS)]
+            interval = {'Fixed Day Of Month': 1 + i % 28, 'Weather Forecast': 3}.get(algorithm, 7)
+            template_id = self._new_id()
+            self.work_packages[template_id] = self.work_package(
+                template_id, 1 + i % self.num_projects, 1 + i % self.num_types, (today - timedelta(days=30)).isoformat(),
+                **{
+                    'Auto Scheduling Algorithm': {'href': f'/api/v3/custom_options/{ALGORITHMS.index(algorithm) + 1}', 'title': algorithm},
+                    'Interval/Day Of Month': interval,
+                    'Target Project': target,
+                    'Weather Conditions': '{"precipitation": 0.1}' if algorithm == 'Weather Forecast' else None,
+                    'Weather Detected Status': False,
+                }
+            )
+            for h in range(history):
+                clone_id = self._new_id()
+                on = (today - timedelta(days=interval * (h + 1))).isoformat()
+                self.work_packages[clone_id] = self.work_package(clone_id, self.target_project_id, 1, on, CLOSED)
+                self.add_relation(clone_id, template_id)
+
+    def add_relation(self, from_: int, to: int) -> dict:
+        relation = {
+            'id': len(self.relations) + 1, '_type': 'Relation', 'type': 'duplicates',
+            '_links': {'from': {'href': f'/api/v3/work_packages/{from_}'}, 'to': {'href': f'/api/v3/work_packages/{to}'}}
+        }
+        self.relations.append(relation)
+        self.duplicate_of[from_] = to
+        return relation
+
+    # ————————————————————————— Filtering —————————————————————————
+
+    @staticmethod
+    def _link_id(data: dict, name: str) -> int:
+        return int(data['_links'][name]['href'].split('/')[-1])
+
+    def _matches(self, work_package: dict, filters: list[dict]) -> bool:
+        for f in filters:
+            (key, value), = f.items()
+            operator, values = value['operator'], value.get('values')
+            if key == 'status_id':
+                closed = self._link_id(work_package, 'status') == CLOSED
+                if (operator == 'o') == closed:
+                    return False
+            elif key in ('project_id', 'type', 'id'):
+                link = {'project_id': 'project', 'type': 'type'}.get(key)
+                actual = work_package['id'] if link is None else self._link_id(work_package, link)
+                if actual not in {int(v) for v in values}:
+                    return False
+            elif key == 'duplicates':
+                if self.duplicate_of.get(work_package['id']) not in {int(v) for v in values}:
+                    return False
+            elif operator == '!*':
+                if work_package.get(key) is not None:
+                    return False
+            elif operator == '<>d':
+                actual = work_package.get(key)
+                low, high = values
+                if (actual is None) or (low and actual < low) or (high and actual[:len(high)] > high):
+                    return False
+            elif str(work_package.get(key)) not in {str(v) for v in values}:
+                return False
+        return True
+
+    def _relation_matches(self, relation: dict, filters: list[dict]) -> bool:
+        for f in filters:
+            (key, value), = f.items()
+            if (key in ('from', 'to')) and (self._link_id(relation, key) not in {int(v) for v in value['values']}):
+                return False
+        return True
+
+    @staticmethod
+    def _project(element: dict, fields: list[str]) -> dict:
+        """Keeps only the selected attributes and links of an element.
+        """
+        projected = {k: v for k, v in element.items() if k in fields}
+        projected['_links'] = {k: v for k, v in element.get('_links', {}).items() if k in fields}
+        return projected
+
+    def page(self, request: web.Request, elements: list[dict]) -> web.Response:
+        offset = int(request.query.get('offset', 1))
+        page_size = int(request.query.get('pageSize', 20))
+        chunk = elements[(offset - 1) * page_size: offset * page_size]
+        select = request.query.get('select')
+        if select:
+            fields = [s.split('/', 1)[1] for s in select.split(',') if s.startswith('elements/')]
+            chunk = [self._project(e, fields) for e in chunk]
+        return self.respond(request, {'_type': 'Collection', 'total': len(elements), 'count': len(chunk), '_embedded': {'elements': chunk}})
+
+    def respond(self, request: web.Request, data: dict, status: int=200) -> web.Response:
+        body = json.dumps(data).encode()
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        stats = self.stats[f'{request.method} {route}']
+        stats['requests'] += 1
+        stats['bytes'] += len(body)
+        return web.Response(body=body, status=status, content_type='application/json')
+
+    # ————————————————————————— Routes —————————————————————————
+
+    async def projects(self, request: web.Request) -> web.Response:
+        projects = [{'id': i, 'active': True, 'name': f'Templates {i}'} for i in range(1, self.num_projects + 1)]
+        projects.append({'id': self.target_project_id, 'active': True, 'name': 'Work'})
+        return self.respond(request, {'_embedded': {'elements': projects}})
+
+    async def types(self, request: web.Request) -> web.Response:
+        types = [{'id': i, 'name': f'Type {i}'} for i in range(1, self.num_types + 1)]
+        return self.respond(request, {'_embedded': {'elements': types}})
+
+    async def schema(self, request: web.Request) -> web.Response:
+        project_id, type_id = request.match_info['schema_id'].split('-')
+        data = {
+            '_type': 'Schema',
+            'id': {'writable': False},
+            'lockVersion': {'writable': False},
+            'subject': {'writable': True},
+            'author': {'writable': False},
+            '_links': {'self': {'href': f'/api/v3/work_packages/schemas/{project_id}-{type_id}'}}
+        }
+        if int(project_id) != self.target_project_id:
+            for i, name in enumerate(CUSTOM_FIELDS, 1):
+                data[f'customField{i}'] = {'name': name, 'writable': True}
+        return self.respond(request, data)
+
+    async def query_work_packages(self, request: web.Request) -> web.Response:
+        key = ('work_packages', request.query.get('filters', '[]'))
+        if key not in self._filtered:
+            filters = json.loads(key[1])
+            self._filtered[key] = [w for w in self.work_packages.values() if self._matches(w, filters)]
+        return self.page(request, self._filtered[key])
+
+    async def query_relations(self, request: web.Request) -> web.Response:
+        key = ('relations', request.query.get('filters', '[]'))
+        if key not in self._filtered:
+            filters = json.loads(key[1])
+            self._filtered[key] = [r for r in self.relations if self._relation_matches(r, filters)]
+        return self.page(request, self._filtered[key])
+
+    async def create_work_package(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        data.update({'id': self._new_id(), 'lockVersion': 0, 'updatedAt': self._now()})
+        data.setdefault('_type', 'WorkPackage')
+        data['_links']['project'] = {'href': f"/api/v3/projects/{request.match_info['project_id']}"}
+        data['_links']['status'] = {'href': f'/api/v3/statuses/{OPEN}'}
+        self.work_packages[data['id']] = data
+        self._changed()
+        return self.respond(request, data, status=201)
+
+    async def create_relation(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        relation = self.add_relation(self._link_id(data, 'from'), self._link_id(data, 'to'))
+        self._changed()
+        return self.respond(request, relation, status=201)
+
+    async def update_work_package(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        work_package = self.work_packages[int(request.match_info['work_package_id'])]
+        data.pop('lockVersion', None)
+        work_package.update(data)
+        work_package['lockVersion'] += 1
+        work_package['updatedAt'] = self._now()
+        self._changed()
+        return self.respond(request, work_package)
+
+    async def forecast(self, request: web.Request) -> web.Response:
+        n = int(request.query['forecast_days']) * 96
+        series = {'precipitation': [0.5] * n, 'wind_speed_10m': [1.0] * n, 'wind_gusts_10m': [2.0] * n}
+        return self.respond(request, {'minutely_15': series})
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 ** 2)
+        app.router.add_get('/api/v3/projects', self.projects)
+        app.router.add_get('/api/v3/projects/{project_id}/types', self.types)
+        app.router.add_get('/api/v3/work_packages/schemas/{schema_id}', self.schema)
+        app.router.add_get('/api/v3/work_packages', self.query_work_packages)
+        app.router.add_get('/api/v3/relations', self.query_relations)
+        app.router.add_post('/api/v3/projects/{project_id}/work_packages', self.create_work_package)
+        app.router.add_post('/api/v3/work_packages/{work_package_id}/relations', self.create_relation)
+        app.router.add_patch('/api/v3/work_packages/{work_package_id}', self.update_work_package)
+        app.router.add_get('/v1/forecast', self.forecast)
+        app.router.add_get('/_stats', self.get_stats)
+        return app
+
+
+# ————————————————————————— Main —————————————————————————
+
+def add_seed_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--projects', type=int, default=10, help='template projects')
+    parser.add_argument('--types', type=int, default=3, help='work package types per project')
+    parser.add_argument('--templates', type=int, default=500, help='templates, spread over the algorithms')
+    parser.add_argument('--history', type=int, default=20, help='closed clones per template')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+    mock = MockOpenProject(args.projects, args.types, args.templates, args.history)
+    web.run_app(mock.build_app(), host=args.host, port=args.port, print=None, access_log=None)
@@ -0,0 +1,158 @@
+"""Benchmarks a scheduling run against a local mock OpenProject server seeded with
+synthetic data. The wall time, requests, bytes and peak rss are reported for every
+phase, so regressions in the calculators or the api client show up before deploy.
+
+    python benchmarks/run.py --templates 2000 --history 50 --json report.json
+
+The scheduler is configured through the usual environment variables, the api and
+weather urls are pointed at the mock and the metadata cache is disabled unless
+METADATA_CACHE_PATH is set.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import resource
+import subprocess
+from pathlib import Path
+from urllib.request import urlopen
+from mock_openproject import add_seed_arguments
+
+APP_DIR = Path(__file__).resolve().parents[1]
+
+
+# ————————————————————————— Models —————————————————————————
+
+class PhaseRecorder:
+    """Records the wall time, client side request and byte counts and peak rss of
+    each phase of a run.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.phases: list[dict] = []
+
+    @staticmethod
+    def peak_rss_mb() -> float:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # linux reports kilobytes, macos reports bytes
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+    async def measure(self, name: str, awaitable):
+        before = dict(self.client.stats)
+        started = time.perf_counter()
+        result = await awaitable
+        self.phases.append({
+            'phase': name,
+            'wall_ms': round((time.perf_counter() - started) * 1000, 1),
+            'requests': self.client.stats['requests'] - before['requests'],
+            'bytes_sent': self.client.stats['bytes_sent'] - before['bytes_sent'],
+            'bytes_received': self.client.stats['bytes_received'] - before['bytes_received'],
+            'peak_rss_mb': round(self.peak_rss_mb(), 1),
+        })
+        return result
+
+    def table(self) -> str:
+        header = f'{"phase":<28}{"wall ms":>10}{"requests":>10}{"sent":>12}{"received":>14}{"peak rss mb":>13}'
+        rows = [
+            f'{p["phase"]:<28}{p["wall_ms"]:>10}{p["requests"]:>10}{p["bytes_sent"]:>12}{p["bytes_received"]:>14}{p["peak_rss_mb"]:>13}'
+            for p in self.phases
+        ]
+        return '\n'.join([header, *rows])
+
+
+# ————————————————————————— Functions —————————————————————————
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_mock(port: int, args: argparse.Namespace) -> subprocess.Popen:
+    """Starts the mock server in its own process so it doesn't skew the measurements,
+    then waits for it to accept connections.
+    """
+    command = [
+        sys.executable, str(Path(__file__).with_name('mock_openproject.py')), '--port', str(port),
+        '--projects', str(args.projects), '--types', str(args.types),
+        '--templates', str(args.templates), '--history', str(args.history),
+    ]
+    process = subprocess.Popen(command)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('mock server failed to start')
+
+
+async def benchmark() -> PhaseRecorder:
+    import common as com
+    import recurring as rc
+
+    recorder = PhaseRecorder(com.get_client())
+    try:
+        schemas = await recorder.measure('schemas', rc.query_scheduling_schemas())
+        templates = await recorder.measure('templates', rc.query_templates(schemas))
+        clone_index = await recorder.measure(
+            'clone index', rc.CloneIndex.build(templates, rc.calculate_occurrences(templates))
+        )
+        scheduling_infos = []
+        for name, func in rc.CALCULATORS.items():
+            scheduling_infos += await recorder.measure(name.lower(), func(templates, clone_index))
+        projects = await recorder.measure('projects', rc.ProjectIndex.build())
+        await recorder.measure('apply', asyncio.gather(*[si.apply(projects) for si in scheduling_infos]))
+        # a second pass finds the clones just created, the steady state of a scheduler
+        await recorder.measure('run once (warm)', rc.run_once())
+    finally:
+        await com.close_clients()
+    return recorder
+
+
+# ————————————————————————— Main —————————————————————————
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    parser.add_argument('--json', type=Path, help='also write the report to this file')
+    args = parser.parse_args()
+
+    port = free_port()
+    mock = start_mock(port, args)
+    try:
+        os.environ.update({
+            'API_KEY': os.environ.get('API_KEY', 'benchmark'),
+            'HOST': '127.0.0.1',
+            'PORT': str(port),
+            'HTTPS': 'False',
+            'WEATHER_URL': f'http://127.0.0.1:{port}/v1/forecast',
+            'LATITUDE': os.environ.get('LATITUDE', '43.6'),
+            'LONGITUDE': os.environ.get('LONGITUDE', '-116.2'),
+        })
+        os.environ.setdefault('METADATA_CACHE_PATH', '')
+        logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING'), format='%(asctime)s - %(levelname)s - %(message)s')
+        sys.path.insert(0, str(APP_DIR))
+
+        started = time.perf_counter()
+        recorder = asyncio.run(benchmark())
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        with urlopen(f'http://127.0.0.1:{port}/_stats') as response:
+            server_stats = json.load(response)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    print(recorder.table())
+    print(f'total {total_ms} ms')
+    if args.json is not None:
+        report = {'seed': {k: v for k, v in vars(args).items() if k != 'json'}, 'total_ms': total_ms,
+                  'phases': recorder.phases, 'server': server_stats}
+        args.json.write_text(json.dumps(report, indent=2))
@@ -0,0 +1,207 @@
+import json
+import time
+import sqlite3
+import logging
+from pathlib import Path
+from datetime import date
+from typing import Any, ClassVar, Optional
+
+
+# ————————————————————————— Models —————————————————————————
+
+class SQLiteStore:
+    """Base of the stores below. The database is opened on first use, creating it and
+    the tables of the store's schema if necessary.
+    """
+
+    SCHEMA: ClassVar[tuple[str, ...]] = ()
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._connection: sqlite3.Connection | None = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            with self._connection:
+                for statement in self.SCHEMA:
+                    self._connection.execute(statement)
+        return self._connection
+
+    def get_state(self, key: str) -> Optional[str]:
+        """Returns a value from the state table, for stores whose schema has one.
+        """
+        row = self.connection.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_state(self, key: str, value: str):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', (key, value))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class MetadataCache(SQLiteStore):
+    """Key value store backed by SQLite, used to persist api responses that rarely
+    change (projects, types and schemas) between runs. Entries expire after their
+    ttl and can be invalidated explicitly by key prefix.
+    """
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)',)
+
+    def __init__(self, path: Path | str, ttl: float):
+        super().__init__(path)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the value stored under key, or None if it is missing or expired.
+        """
+        row = self.connection.execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires < time.time():
+            logging.debug('metadata cache entry %s expired', key)
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float]=None):
+        """Stores a json serializable value under key for ttl seconds.
+        """
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)',
+                (key, json.dumps(value), expires)
+            )
+
+    def invalidate(self, prefix: str='') -> int:
+        """Removes every entry whose key starts with prefix and returns the number
+        of entries removed. An empty prefix clears the whole cache.
+        """
+        with self.connection:
+            cursor = self.connection.execute('DELETE FROM entries WHERE substr(key, 1, ?) = ?', (len(prefix), prefix))
+        logging.debug('invalidated %d metadata cache entries with prefix %r', cursor.rowcount, prefix)
+        return cursor.rowcount
+
+
+class SyncSnapshot(SQLiteStore):
+    """SQLite backed snapshot of the templates and the provenance of their clones,
+    used by incremental sync to merge in only what changed since the last run.
+    Templates and clones are stored as their raw json representation.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS templates (id INTEGER PRIMARY KEY, data TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS clones (id INTEGER PRIMARY KEY, template_id INTEGER NOT NULL, is_open INTEGER NOT NULL, data TEXT NOT NULL)',
+    )
+
+    def load_templates(self) -> list[dict]:
+        return [json.loads(data) for data, in self.connection.execute('SELECT data FROM templates ORDER BY id')]
+
+    def load_clones(self) -> list[tuple[int, bool, dict]]:
+        """Returns (template id, is open, clone data) for every clone in the snapshot.
+        """
+        rows = self.connection.execute('SELECT template_id, is_open, data FROM clones ORDER BY id')
+        return [(template_id, bool(is_open), json.loads(data)) for template_id, is_open, data in rows]
+
+    def template_ids(self) -> set[int]:
+        return {template_id for template_id, in self.connection.execute('SELECT id FROM templates')}
+
+    def clone_templates(self) -> dict[int, int]:
+        """Returns a mapping of clone id to template id.
+        """
+        return dict(self.connection.execute('SELECT id, template_id FROM clones'))
+
+    def upsert_templates(self, templates: list[dict]):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO templates (id, data) VALUES (?, ?)',
+                [(t['id'], json.dumps(t)) for t in templates]
+            )
+
+    def delete_templates(self, ids: list[int]):
+        with self.connection:
+            self.connection.executemany('DELETE FROM templates WHERE id = ?', [(i,) for i in ids])
+
+    def upsert_clones(self, clones: list[tuple[int, bool, dict]]):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO clones (id, template_id, is_open, data) VALUES (?, ?, ?, ?)',
+                [(c['id'], template_id, int(is_open), json.dumps(c)) for template_id, is_open, c in clones]
+            )
+
+    def delete_clones_of(self, template_ids: list[int]):
+        with self.connection:
+            self.connection.executemany('DELETE FROM clones WHERE template_id = ?', [(i,) for i in template_ids])
+
+    def replace(self, templates: list[dict], clones: list[tuple[int, bool, dict]], state: Optional[dict[str, str]]=None):
+        """Replaces the whole snapshot and updates the state, used after a full sync.
+        Everything is written in a single transaction, so a failure part way through
+        leaves the previous snapshot and state in place.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM templates')
+            self.connection.execute('DELETE FROM clones')
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO templates (id, data) VALUES (?, ?)',
+                [(t['id'], json.dumps(t)) for t in templates]
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO clones (id, template_id, is_open, data) VALUES (?, ?, ?, ?)',
+                [(c['id'], template_id, int(is_open), json.dumps(c)) for template_id, is_open, c in clones]
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                list((state or {}).items())
+            )
+
+    def copy(self) -> 'SyncSnapshot':
+        """Returns an in memory copy of the snapshot, changes to it are never written back.
+        """
+        copy = SyncSnapshot(':memory:')
+        self.connection.backup(copy.connection)
+        return copy
+
+
+class DueIndex(SQLiteStore):
+    """Persistent index of the date each template next needs to be evaluated, kept in
+    a table sorted by due date. Templates that aren't due yet can be skipped, so a
+    run only evaluates the templates whose next occurrence has come around.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS due (template_id INTEGER PRIMARY KEY, due TEXT NOT NULL, lock_version INTEGER)',
+        'CREATE INDEX IF NOT EXISTS due_by_date ON due (due)',
+    )
+
+    def not_due(self, today: date) -> dict[int, Optional[int]]:
+        """Returns the templates that aren't due on today, mapped to the lock version
+        they had when scheduled so that edited templates can still be evaluated.
+        """
+        rows = self.connection.execute('SELECT template_id, lock_version FROM due WHERE due > ?', (today.isoformat(),))
+        return dict(rows)
+
+    def schedule(self, entries: list[tuple[int, date, Optional[int]]]):
+        """Stores the (template id, due date, lock version) entries.
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO due (template_id, due, lock_version) VALUES (?, ?, ?)',
+                [(template_id, due.isoformat(), lock_version) for template_id, due, lock_version in entries]
+            )
+
+    def remove(self, template_ids: list[int]):
+        with self.connection:
+            self.connection.executemany('DELETE FROM due WHERE template_id = ?', [(i,) for i in template_ids])
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute('DELETE FROM due')
@@ -1,15 +1,30 @@
 import json
+import math
+import time
+import random
+import asyncio
 import aiohttp
 import logging
+import contextlib
 from os import environ
+from pathlib import Path
 from base64 import b64encode
-from typing import ClassVar, Self, Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from contextvars import ContextVar
+from collections import defaultdict
+from typing import ClassVar, Self, Optional, Any, AsyncIterator, Iterator
 from pydantic import BaseModel, Field, ConfigDict
+from cache import MetadataCache
+import telemetry
 
 
 # ————————————————————————— Module Scoped Variables —————————————————————————
 MAX_PAGE_SIZE = 1000
 
+# phase that requests made by the current task are attributed to in APIClient.phase_stats
+request_phase: ContextVar[str] = ContextVar('request_phase', default='other')
+
 
 # ————————————————————————— Models —————————————————————————
 
@@ -28,9 +43,60 @@ class APIConfig(BaseModel):
     notify_create:  bool = Field(True)  # notify when creating a new work package
     notify_update:  bool = Field(True)  # notify when update a template work package
     log_level:  int  = Field(logging.WARNING)
+    log_max_bytes:  int = Field(2 * 1024 ** 2)  # size the log file is rotated at
+    log_backups:    int = Field(3)              # rotated log files kept
     port:       Optional[int]  =    Field(None)
     latitude:   Optional[float] =   Field(None)
     longitude:  Optional[float] =   Field(None)
+    # http client tuning, shared by every call in a run
+    pool_size:          int =   Field(100)  # max open connections, 0 for unlimited
+    pool_size_per_host: int =   Field(0)    # max open connections per host, 0 for unlimited
+    keepalive_timeout:  float = Field(30.0) # seconds an idle connection is kept open
+    dns_cache_ttl:      int =   Field(300)  # seconds a dns lookup is cached
+    connect_timeout:    float = Field(10.0)
+    request_timeout:    float = Field(120.0)
+    page_concurrency:   int =   Field(4, ge=1)  # max pages of a collection fetched at once
+    # rate governor for open project calls, adapts between the min and max while running
+    rate_limit:         float = Field(20.0, gt=0)  # initial requests per second
+    min_rate_limit:     float = Field(1.0, gt=0)
+    max_rate_limit:     float = Field(100.0, gt=0)
+    max_in_flight:      int =   Field(16, ge=1)    # upper bound on concurrent requests
+    max_retries:        int =   Field(4)     # retries for GET requests that are throttled or fail
+    retry_backoff:      float = Field(0.5)   # base seconds of the jittered exponential backoff
+    # scheduling pipeline, clones are created by the workers while the algorithms run
+    pipeline_workers:    int =  Field(8, ge=1)
+    pipeline_queue_size: int =  Field(64, ge=0)   # scheduling infos buffered before the algorithms wait
+    # persistent cache for projects, types and schemas, set the path to an empty string to disable
+    metadata_cache_path: str =  Field(str(Path(__file__).parent / 'cache' / 'metadata.sqlite3'))
+    metadata_ttl:       float = Field(6 * 60 * 60)  # seconds before cached metadata is refetched
+    # incremental sync, only fetches templates and clones updated since the last run
+    incremental_sync:     bool =  Field(False)
+    snapshot_path:        str =   Field(str(Path(__file__).parent / 'cache' / 'snapshot.sqlite3'))
+    full_resync_interval: float = Field(24 * 60 * 60)  # seconds between full syncs, the safety net for missed changes
+    # due index, skips date based templates until their next occurrence comes around
+    due_index:          bool =  Field(False)
+    due_index_path:     str =   Field(str(Path(__file__).parent / 'cache' / 'due.sqlite3'))
+    # weather forecasts, cached per grid cell and horizon in the metadata cache, or in memory without it
+    weather_url:        str =   Field('https://api.open-meteo.com/v1/forecast')
+    forecast_ttl:       float = Field(60 * 60)  # seconds before a cached forecast is refetched
+    forecast_grid:      float = Field(0.1)      # degrees locations are rounded to, about 11km
+    # opentelemetry spans and metrics, sent to the otlp endpoint or else appended to the telemetry path
+    telemetry:          bool =  Field(False)
+    otel_exporter_otlp_endpoint: Optional[str] = Field(None)  # e.g. http://otel-collector:4318
+    telemetry_path:     str =   Field(str(Path(__file__).parent / 'logs' / 'telemetry.jsonl'))
+    telemetry_interval: float = Field(60)  # seconds between metric exports
+    # stamp clones with the Source Template and Scheduled Occurrence custom fields, once both
+    # exist clones are looked up by them instead of through their relations
+    provenance_fields:  bool =  Field(False)
+    # scheduler daemon, only used when running with --daemon
+    daemon_interval:    float = Field(20 * 60)  # seconds between scheduling passes
+    daemon_jitter:      float = Field(60)       # max seconds randomly added or removed from the interval
+    # webhook receiver for fixed delay scheduling, only started by the daemon when a port is set
+    webhook_port:       Optional[int] = Field(None)
+    webhook_host:       str =           Field('0.0.0.0')
+    webhook_path:       str =           Field('/webhooks/openproject')
+    webhook_secret:     Optional[str] = Field(None)
+    webhook_reconcile_interval: float = Field(6 * 60 * 60)  # seconds between fixed delay polling passes
 
 
     @classmethod
@@ -57,8 +123,294 @@ class APIConfig(BaseModel):
         return token
 
 
+# ————————————————————————— Clients —————————————————————————
+
+class RateGovernor:
+    """Central governor for the requests sent to OpenProject. A token bucket limits
+    the request rate and a second limit bounds the requests in flight. Both adapt the
+    way tcp does, growing by one a second while responses are healthy and halving when the
+    server throttles, errors or times out. A Retry-After header pauses every request.
+    """
+
+    def __init__(self, config: APIConfig):
+        self.config = config
+        self.rate = config.rate_limit
+        self.concurrency = float(config.max_in_flight)
+        self.in_flight = 0
+        self.stats = {'throttled': 0, 'retries': 0}
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._increased = self._updated
+        self._blocked_until = 0.0
+        self._condition: asyncio.Condition | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        """Returns the condition waiters are parked on, rebuilt if the loop has changed.
+        """
+        loop = asyncio.get_running_loop()
+        if (self._condition is None) or (self._loop is not loop):
+            self._condition = asyncio.Condition()
+            self._loop = loop
+            self.in_flight = 0
+        return self._condition
+
+    def _refill(self, now: float):
+        # the bucket holds at most one second worth of tokens, so bursts stay bounded
+        self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Waits until a request may be sent.
+        """
+        condition = self.condition
+        async with condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    wait = None  # woken up by release
+                elif self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    return
+                try:
+                    await asyncio.wait_for(condition.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, healthy: bool, retry_after: Optional[float]=None):
+        """Returns the slot of a finished request and adapts the limits to its outcome.
+        """
+        config = self.config
+        condition = self.condition
+        async with condition:
+            self.in_flight = max(self.in_flight - 1, 0)
+            now = time.monotonic()
+            if healthy:
+                # grow at most once a second, however many requests finish in it
+                if now - self._increased >= 1.0:
+                    self.rate = min(config.max_rate_limit, self.rate + 1.0)
+                    self.concurrency = min(config.max_in_flight, self.concurrency + 1.0)
+                    self._increased = now
+            else:
+                self.stats['throttled'] += 1
+                self.rate = max(config.min_rate_limit, self.rate / 2)
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self._tokens = min(self._tokens, 0.0)
+                self._increased = now
+                logging.debug('backing off to %.1f requests/s with %d in flight', self.rate, int(self.concurrency))
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            condition.notify_all()
+
+    def backoff(self, attempt: int, retry_after: Optional[float]=None) -> float:
+        """Returns the seconds to wait before retrying, honouring Retry-After when given.
+        """
+        if retry_after is not None:
+            return retry_after
+        return self.config.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header, given either in seconds or as an http date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class APIClient:
+    """Long lived http client that is shared by every api call in a run.
+    Reusing a single session keeps the connection pool warm so that requests,
+    including every page of a paginated query, skip the tcp/tls handshake.
+    """
+
+    def __init__(self, config: APIConfig):
+        self.config = config
+        self.stats = {'requests': 0, 'connections_created': 0, 'connections_reused': 0, 'bytes_sent': 0, 'bytes_received': 0}
+        self.phase_stats: defaultdict[str, dict[str, int]] = defaultdict(lambda: {'requests': 0, 'bytes_sent': 0, 'bytes_received': 0})
+        self.read_only = False  # set by plan mode, any request other than GET raises
+        self.governor = RateGovernor(config)
+        self._session: aiohttp.ClientSession | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Returns the underlying session, building it on first use. Sessions are
+        bound to an event loop, so a new one is built if the loop has changed.
+        """
+        loop = asyncio.get_running_loop()
+        if (self._session is None) or self._session.closed or (self._loop is not loop):
+            self._session = self._build_session()
+            self._loop = loop
+        return self._session
+
+    def _build_session(self) -> aiohttp.ClientSession:
+        config = self.config
+        connector = aiohttp.TCPConnector(
+            limit=config.pool_size,
+            limit_per_host=config.pool_size_per_host,
+            keepalive_timeout=config.keepalive_timeout,
+            ttl_dns_cache=config.dns_cache_ttl,
+        )
+        timeout = aiohttp.ClientTimeout(total=config.request_timeout, connect=config.connect_timeout)
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_request_chunk_sent.append(self._on_request_chunk_sent)
+        trace_config.on_response_chunk_received.append(self._on_response_chunk_received)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config])
+
+    async def _on_request_start(self, session, context, params):
+        self.stats['requests'] += 1
+        self.phase_stats[request_phase.get()]['requests'] += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.stats['connections_created'] += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.stats['connections_reused'] += 1
+
+    async def _on_request_chunk_sent(self, session, context, params):
+        self.stats['bytes_sent'] += len(params.chunk)
+        self.phase_stats[request_phase.get()]['bytes_sent'] += len(params.chunk)
+
+    async def _on_response_chunk_received(self, session, context, params):
+        self.stats['bytes_received'] += len(params.chunk)
+        self.phase_stats[request_phase.get()]['bytes_received'] += len(params.chunk)
+
+    async def request(self, method: str, url: str, governed: bool=True, **kwargs) -> tuple[int, Any]:
+        """Sends a request and returns the status code along with the decoded json body.
+        Certificate verification follows the config unless ssl is passed explicitly.
+        Governed requests wait on the rate governor. GET requests are idempotent, so
+        they are retried when throttled, on server errors and on connection failures.
+        Raises a RuntimeError for anything but a GET while the client is read only.
+        """
+        if self.read_only and (method.upper() != 'GET'):
+            raise RuntimeError(f'{method} {url} refused, the client is read only')
+        endpoint = telemetry.endpoint_of(url)
+        attributes = {'http.request.method': method, 'url.path': endpoint}
+        with telemetry.timed(f'{method} {endpoint}', 'http.client.request.duration', **attributes) as span:
+            status, data = await self._send(method, url, governed, **kwargs)
+            if span is not None:
+                span.set_attribute('http.response.status_code', status)
+            return status, data
+
+    async def _send(self, method: str, url: str, governed: bool, **kwargs) -> tuple[int, Any]:
+        kwargs.setdefault('ssl', self.config.verify_ssl)
+        retries = self.config.max_retries if method.upper() == 'GET' else 0
+        attempt = 0
+        while True:
+            if governed:
+                await self.governor.acquire()
+            healthy, retry_after = True, None
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    healthy = (response.status != 429) and (response.status < 500)
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if healthy or (attempt >= retries):
+                        if healthy:
+                            data = await response.json()
+                        else:
+                            try:
+                                data = await response.json(content_type=None)
+                            except ValueError:
+                                data = None
+                        return response.status, data
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                healthy = False
+                if attempt >= retries:
+                    raise
+            finally:
+                if governed:
+                    await self.governor.release(healthy, retry_after)
+            delay = self.governor.backoff(attempt, retry_after)
+            attempt += 1
+            self.governor.stats['retries'] += 1
+            logging.debug('retrying %s %s in %.2fs, attempt %d of %d', method, url, delay, attempt, retries)
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        if (self._session is not None) and (not self._session.closed):
+            await self._session.close()
+        self._session = None
+        logging.debug('http client closed with stats %s %s', self.stats, self.governor.stats)
+
+
 # ————————————————————————— Functions —————————————————————————
 
+_clients: dict[APIConfig, APIClient] = {}
+
+
+@contextlib.contextmanager
+def attribute_requests(phase: str) -> Iterator[None]:
+    """Attributes the requests and bytes of the enclosed block to a phase in
+    APIClient.phase_stats. Tasks started inside the block inherit the phase.
+    """
+    token = request_phase.set(phase)
+    try:
+        yield
+    finally:
+        request_phase.reset(token)
+
+
+def get_client(config: APIConfig=APIConfig.from_env()) -> APIClient:
+    """Returns the shared client for the config, creating it on the first call.
+    """
+    if config not in _clients:
+        _clients[config] = APIClient(config)
+    return _clients[config]
+
+
+_metadata_caches: dict[APIConfig, MetadataCache] = {}
+_forecast_caches: dict[APIConfig, MetadataCache] = {}
+
+
+def get_metadata_cache(config: APIConfig=APIConfig.from_env()) -> MetadataCache | None:
+    """Returns the persistent metadata cache for the config, or None if it is disabled.
+    """
+    if not config.metadata_cache_path:
+        return None
+    if config not in _metadata_caches:
+        _metadata_caches[config] = MetadataCache(config.metadata_cache_path, config.metadata_ttl)
+    return _metadata_caches[config]
+
+
+def get_forecast_cache(config: APIConfig=APIConfig.from_env()) -> MetadataCache:
+    """Returns the cache forecasts are kept in, the metadata cache unless it is disabled,
+    in which case forecasts are only cached in memory for the life of the process.
+    """
+    cache = get_metadata_cache(config)
+    if cache is not None:
+        return cache
+    if config not in _forecast_caches:
+        _forecast_caches[config] = MetadataCache(':memory:', config.forecast_ttl)
+    return _forecast_caches[config]
+
+
+async def close_clients():
+    """Closes every shared client, should be called once the run is finished.
+    """
+    for client in _clients.values():
+        await client.close()
+
+
+
 def build_url(endpoint: str, config: APIConfig=APIConfig.from_env()) -> str:
     """Returns a url for the endpoint using the apps configs.
     """
@@ -68,179 +420,233 @@ def build_url(endpoint: str, config: APIConfig=APIConfig.from_env()) -> str:
     return url
 
 
-async def query_forecast(num_days: int, config: APIConfig=APIConfig.from_env()):
+async def cached_get(key: str, url: str, config: APIConfig=APIConfig.from_env(), **kwargs) -> dict:
+    """Returns the json body for a GET request, reading it from the persistent metadata
+    cache when possible. Only successful responses are cached.
+    """
+    cache = get_metadata_cache(config)
+    if cache is not None:
+        data = cache.get(key)
+        telemetry.count('scheduler.cache.requests', cache='metadata', result='miss' if data is None else 'hit')
+        if data is not None:
+            return data
+    status, data = await get_client(config).request('GET', url, **kwargs)
+    if (cache is not None) and (status == 200):
+        cache.set(key, data)
+    return data
+
+
+def build_headers(config: APIConfig=APIConfig.from_env(), content_type: str='application/hal+json') -> dict:
+    """Returns the headers used for requests to the open project api.
+    """
+    headers = {
+        'Accept': 'application/hal+json',
+        'Content-Type': content_type,
+        'Authorization': f'Basic {config.api_token}',
+    }
+    return headers
+
+
+def forecast_cell(latitude: float, longitude: float, config: APIConfig=APIConfig.from_env()) -> tuple[float, float]:
+    """Returns the grid cell a location falls in, locations in the same cell share a forecast.
+    """
+    grid = config.forecast_grid
+    return (round(round(latitude / grid) * grid, 6), round(round(longitude / grid) * grid, 6))
+
+
+async def query_forecast(num_days: int, config: APIConfig=APIConfig.from_env(), latitude: Optional[float]=None, longitude: Optional[float]=None):
     """Queries the forecast for the weather codes in 15 minute increments using the
     open-meteo api. The weather codes can then be used to generate work packages
-    based on weather events.
+    based on weather events. The location defaults to the configured one and is
+    rounded to its grid cell, forecasts are cached per cell and horizon.
     """
     if not (0 <= num_days <= 16):
         raise ValueError(f'num_days must be between 0 and 16 inclusive. Actual value = {num_days}')
 
-    async with aiohttp.ClientSession() as session:
-        url = 'https://api.open-meteo.com/v1/forecast'
-        params = {
-            'latitude': config.latitude,
-            'longitude': config.longitude,
-            'forecast_days': num_days,
-            'minutely_15': ','.join(['precipitation', 'wind_speed_10m' ,'wind_gusts_10m'])
-        }
-        async with session.get(url, params=params) as response:
-            if response.status != 200:
-                logging.warning(f'Weather API returned status {response.status}, skipping forecast')
-                return None
-            data: dict = await response.json()
-            return data
+    latitude = config.latitude if latitude is None else latitude
+    longitude = config.longitude if longitude is None else longitude
+    if (latitude is not None) and (longitude is not None):
+        latitude, longitude = forecast_cell(latitude, longitude, config)
+
+    key = f'forecast:{latitude},{longitude}:{num_days}'
+    cache = get_forecast_cache(config)
+    data = cache.get(key)
+    telemetry.count('scheduler.cache.requests', cache='forecast', result='miss' if data is None else 'hit')
+    if data is not None:
+        return data
+
+    params = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'forecast_days': num_days,
+        'minutely_15': ','.join(['precipitation', 'wind_speed_10m' ,'wind_gusts_10m'])
+    }
+    status, data = await get_client(config).request('GET', config.weather_url, params=params, ssl=True, governed=False)
+    if status != 200:
+        logging.warning(f'Weather API returned status {status}, skipping forecast')
+        return None
+    cache.set(key, data, ttl=config.forecast_ttl)
+    return data
 
 
 async def query_projects(filters: Optional[dict]=None, config: APIConfig=APIConfig.from_env()) -> dict:
     """Returns a list of projects using the filters provided
     """
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=config.verify_ssl)) as session:
-        url = build_url('api/v3/projects', config)
-        headers = {
-            'Accept': 'application/hal+json',
-            'Content-Type': 'application/hal+json',
-            'Authorization': f'Basic {config.api_token}',
-        }
-        params = {}
-        if filters is not None:
-            params['filters'] = filters if isinstance(filters, str) else json.dumps(filters)
-        async with session.get(url, headers=headers, params=params) as response:
-            data: dict = await response.json()
-            return data
+    url = build_url('api/v3/projects', config)
+    headers = build_headers(config)
+    params = {}
+    if filters is not None:
+        params['filters'] = filters if isinstance(filters, str) else json.dumps(filters)
+    key = f"projects:{params.get('filters', '')}"
+    return await cached_get(key, url, config, headers=headers, params=params)
 
 
 async def query_work_package_types(project_id: int, config: APIConfig=APIConfig.from_env()) -> dict:
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=config.verify_ssl)) as session:
-        url = build_url(f'api/v3/projects/{project_id}/types', config)
-        headers = {
-            'Accept': 'application/hal+json',
-            'Content-Type': 'application/hal+json',
-            'Authorization': f'Basic {config.api_token}',
-
-        }
-        async with session.get(url, headers=headers) as response:
-            data: dict = await response.json()
-            return data
+    url = build_url(f'api/v3/projects/{project_id}/types', config)
+    headers = build_headers(config)
+    return await cached_get(f'types:{project_id}', url, config, headers=headers)
 
 
 async def query_work_package_schema(project_id: int, work_package_type_id: int, config: APIConfig=APIConfig.from_env()) -> dict:
     """Queries the work package schema for a project id given the work package type id
     also has the side effect of updating the WorkPackage model field map
     """
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=config.verify_ssl)) as session:
-        url = build_url(f'api/v3/work_packages/schemas/{project_id}-{work_package_type_id}', config)
-        headers = {
-            'Accept': 'application/hal+json',
-            'Content-Type': 'application/hal+json',
-            'Authorization': f'Basic {config.api_token}',
-        }
-        async with session.get(url, headers=headers) as response:
-            data: dict = await response.json()
-            return data
+    url = build_url(f'api/v3/work_packages/schemas/{project_id}-{work_package_type_id}', config)
+    headers = build_headers(config)
+    return await cached_get(f'schema:{project_id}-{work_package_type_id}', url, config, headers=headers)
 
 
-async def query_work_packages(offset: int=1, page_size: int=MAX_PAGE_SIZE, filters: Optional[dict]=None, config: APIConfig=APIConfig.from_env()) -> dict:
+def build_select(select: Optional[list[str]]) -> Optional[str]:
+    """Returns the select parameter that projects the elements of a collection onto
+    the fields given, keeping the totals needed for pagination.
+    """
+    if select is None:
+        return None
+    return ','.join(['total', 'count', *[f'elements/{field}' for field in select]])
+
+
+async def fetch_page(endpoint: str, offset: int, page_size: int, filters: Optional[dict]=None, content_type: str='application/hal+json', select: Optional[list[str]]=None, config: APIConfig=APIConfig.from_env()) -> dict:
+    """Returns a single page of a paginated collection, optionally projected
+    onto the fields in select.
+    """
+    url = build_url(endpoint, config)
+    headers = build_headers(config, content_type)
+    params = {
+        'offset': offset,
+        'pageSize': page_size,
+    }
+    if filters is not None:
+        params['filters'] = filters if isinstance(filters, str) else json.dumps(filters)
+    if select is not None:
+        params['select'] = build_select(select)
+    _, data = await get_client(config).request('GET', url, headers=headers, params=params)
+    telemetry.count('openproject.pages', **{'url.path': '/' + endpoint})
+    return data
+
+
+async def query_collection(endpoint: str, offset: int=1, page_size: int=MAX_PAGE_SIZE, filters: Optional[dict]=None, content_type: str='application/hal+json', select: Optional[list[str]]=None, config: APIConfig=APIConfig.from_env()) -> dict:
+    """Returns every element of a paginated collection merged into the first page.
+    The first page's total is used to fetch the remaining pages concurrently, at most
+    config.page_concurrency at a time, and the pages are merged back in order.
+    """
+    data = await fetch_page(endpoint, offset, page_size, filters, content_type, select, config)
+    last_page = math.ceil(data['total'] / page_size)
+    if last_page > offset:
+        semaphore = asyncio.Semaphore(config.page_concurrency)
+        async def bounded_fetch_page(page: int) -> dict:
+            async with semaphore:
+                return await fetch_page(endpoint, page, page_size, filters, content_type, select, config)
+        pages = await asyncio.gather(*[bounded_fetch_page(p) for p in range(offset + 1, last_page + 1)])
+        for more_data in pages:
+            data['_embedded']['elements'].extend(more_data['_embedded']['elements'])
+            data['count'] = data['count'] + more_data['count']
+    return data
+
+
+async def iter_collection(endpoint: str, offset: int=1, page_size: int=MAX_PAGE_SIZE, filters: Optional[dict]=None, content_type: str='application/hal+json', select: Optional[list[str]]=None, config: APIConfig=APIConfig.from_env()) -> AsyncIterator[dict]:
+    """Yields the pages of a paginated collection one at a time. The next page is
+    requested while the current one is consumed, so at most two pages are held in
+    memory regardless of the size of the collection.
+    """
+    def prefetch(page: int) -> asyncio.Future:
+        return asyncio.ensure_future(fetch_page(endpoint, page, page_size, filters, content_type, select, config))
+
+    page = offset
+    task = prefetch(page)
+    try:
+        while task is not None:
+            data = await task
+            last_page = math.ceil(data['total'] / page_size)
+            has_more = (page < last_page) and bool(data['_embedded']['elements'])
+            task = prefetch(page + 1) if has_more else None
+            yield data
+            page += 1
+    finally:
+        # wait for the prefetch to unwind so it isn't left pending when the consumer stops early
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
+
+
+async def query_work_packages(offset: int=1, page_size: int=MAX_PAGE_SIZE, filters: Optional[dict]=None, select: Optional[list[str]]=None, config: APIConfig=APIConfig.from_env()) -> dict:
     """Returns a list of work packages using the filters provided.
-    Results are limited to the page_size specified.
-    """
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=config.verify_ssl)) as session:
-        url = build_url('api/v3/work_packages', config)
-        headers = {
-            'Accept': 'application/hal+json',
-            'Content-Type': 'application/hal+json',
-            'Authorization': f'Basic {config.api_token}',
-        }
-        params = {
-            'offset': offset,
-            'pageSize': page_size,
-        }
-        if filters is not None:
-            params['filters'] = filters if isinstance(filters, str) else json.dumps(filters)
-        async with session.get(url, headers=headers, params=params) as response:
-            data: dict = await response.json()
-            # recursively call until all data is loaded in
-            if offset * page_size < data['total']:
-                more_data = await query_work_packages(offset=offset+1, page_size=page_size, filters=filters, config=config)
-                data['_embedded']['elements'].extend(more_data['_embedded']['elements'])
-                data['count'] = data['count'] + more_data['count']
-            return data
+    Pages of page_size are fetched concurrently until all data is loaded in.
+    """
+    return await query_collection('api/v3/work_packages', offset, page_size, filters, select=select, config=config)
 
 
-async def query_work_package_relations(offset: int=1, page_size: int=MAX_PAGE_SIZE, filters: Optional[dict]=None, config: APIConfig=APIConfig.from_env()) -> dict:
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=config.verify_ssl)) as session:
-        url = build_url('api/v3/relations', config)
-        headers = {
-            'Accept': 'application/hal+json',
-            'Content-Type': 'application/json',
-            'Authorization': f'Basic {config.api_token}',
-        }
-        params = {
-            'offset': offset,
-            'pageSize': page_size
-        }
-        if filters is not None:
-            params['filters'] = filters if isinstance(filters, str) else json.dumps(filters)
-        async with session.get(url, headers=headers, params=params) as response:
-            data: dict = await response.json()
-            # recursively call until all data is loaded in
-            if offset * page_size < data['total']:
-                more_data = await query_work_package_relations(offset=offset+1, page_size=page_size, filters=filters, config=config)
-                data['_embedded']['elements'].extend(more_data['_embedded']['elements'])
-                data['count'] = data['count'] + more_data['count']
-            return data
-            return data
+async def iter_work_packages(offset: int=1, page_size: int=MAX_PAGE_SIZE, filters: Optional[dict]=None, select: Optional[list[str]]=None, config: APIConfig=APIConfig.from_env()) -> AsyncIterator[dict]:
+    """Yields pages of work packages using the filters provided.
+    """
+    async with contextlib.aclosing(iter_collection('api/v3/work_packages', offset, page_size, filters, select=select, config=config)) as pages:
+        async for data in pages:
+            yield data
+
+
+async def query_work_package_relations(offset: int=1, page_size: int=MAX_PAGE_SIZE, filters: Optional[dict]=None, select: Optional[list[str]]=None, config: APIConfig=APIConfig.from_env()) -> dict:
+    return await query_collection('api/v3/relations', offset, page_size, filters, 'application/json', select, config)
+
+
+async def iter_work_package_relations(offset: int=1, page_size: int=MAX_PAGE_SIZE, filters: Optional[dict]=None, select: Optional[list[str]]=None, config: APIConfig=APIConfig.from_env()) -> AsyncIterator[dict]:
+    """Yields pages of relations using the filters provided.
+    """
+    async with contextlib.aclosing(iter_collection('api/v3/relations', offset, page_size, filters, 'application/json', select, config)) as pages:
+        async for data in pages:
+            yield data
 
 
 async def create_work_package(project_id: int, payload: dict, notify: bool=None, config: APIConfig=APIConfig.from_env()) -> dict:
     """Creates a work package in the given project and returns the newly created work package
     """
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=config.verify_ssl)) as session:
-        url = build_url(f'api/v3/projects/{project_id}/work_packages', config)
-        headers = {
-            'Accept': 'application/hal+json',
-            'Content-Type': 'application/json',
-            'Authorization': f'Basic {config.api_token}',
-        }
-        params = {
-            'notify': int(config.notify_create) if notify is None else int(notify)
-        }
-        payload = json.dumps(payload, default=str)
-        async with session.post(url, data=payload, headers=headers, params=params) as response:
-            data: dict = await response.json()
-            return data
+    url = build_url(f'api/v3/projects/{project_id}/work_packages', config)
+    headers = build_headers(config, 'application/json')
+    params = {
+        'notify': int(config.notify_create) if notify is None else int(notify)
+    }
+    payload = json.dumps(payload, default=str)
+    _, data = await get_client(config).request('POST', url, data=payload, headers=headers, params=params)
+    return data
 
 
 async def create_relation(work_package_id: int, payload: dict, config: APIConfig=APIConfig.from_env()) -> dict:
     """Creates a relation between two work packages
     """
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=config.verify_ssl)) as session:
-        url = build_url(f'api/v3/work_packages/{work_package_id}/relations', config)
-        headers = {
-            'Accept': 'application/hal+json',
-            'Content-Type': 'application/json',
-            'Authorization': f'Basic {config.api_token}',
-        }
-        payload = json.dumps(payload, default=str)
-        async with session.post(url, data=payload, headers=headers) as response:
-            data: dict = await response.json()
-            return data
+    url = build_url(f'api/v3/work_packages/{work_package_id}/relations', config)
+    headers = build_headers(config, 'application/json')
+    payload = json.dumps(payload, default=str)
+    _, data = await get_client(config).request('POST', url, data=payload, headers=headers)
+    return data
 
 
 async def update_work_package(work_package_id: int, payload: dict, notify: bool=None, config: APIConfig=APIConfig.from_env()) -> dict:
     """Updates the attributes defined in payload for the work package with the id = work_package_id
     """
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=config.verify_ssl)) as session:
-        url = build_url(f'api/v3/work_packages/{work_package_id}', config)
-        headers = {
-            'Accept': 'application/hal+json',
-            'Content-Type': 'application/json',
-            'Authorization': f'Basic {config.api_token}',
-        }
-        params = {
-            'notify': int(config.notify_update) if notify is None else int(notify)
-        }
-        payload = json.dumps(payload, default=str)
-        async with session.patch(url, data=payload, headers=headers, params=params) as response:
-            data: dict = await response.json()
-            return data
\ No newline at end of file
+    url = build_url(f'api/v3/work_packages/{work_package_id}', config)
+    headers = build_headers(config, 'application/json')
+    params = {
+        'notify': int(config.notify_update) if notify is None else int(notify)
+    }
+    payload = json.dumps(payload, default=str)
+    _, data = await get_client(config).request('PATCH', url, data=payload, headers=headers, params=params)
+    return data
@@ -1,3 +1,7 @@
 #!/usr/bin/sh
+if [ "$RUN_MODE" = "daemon" ]; then
+    # keep one resident process instead of starting a new one from cron every run
+    exec /usr/local/bin/python /app/recurring.py --daemon;
+fi
 printenv > /etc/environment;        # pass enviroment variables for crontab
 cron && tail -f /var/log/cronlog;   # start the cron daemon
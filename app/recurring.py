@@ -1,40 +1,132 @@
 import re
 import sys
 import json
+import math
+import time
+import random
+import signal
+import argparse
+import queue
+import pstats
+import cProfile
 import logging
+import logging.handlers
 import asyncio
+import functools
 from pathlib import Path
 from re import fullmatch
 from itertools import chain
-from collections import defaultdict
-from datetime import date, timedelta
+from collections import defaultdict, OrderedDict
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
 from dateutil.relativedelta import relativedelta
-from typing import Self, ClassVar, Any, Optional
+from typing import Self, ClassVar, Any, Optional, AsyncIterator, Iterable, TextIO
 from pydantic import BaseModel, ConfigDict, Field
 import common as com
+import telemetry
+from cache import SyncSnapshot, DueIndex
+from webhook import WebhookReceiver
 
 
+# ————————————————————————— Module Scoped Variables —————————————————————————
 
+METADATA_TTL = com.APIConfig.from_env().metadata_ttl
+
+_cached_functions: list = []  # every function wrapped by cache_async, used for reporting
+
+# custom fields clones are stamped with when config.provenance_fields is enabled
+SOURCE_TEMPLATE_FIELD = 'Source Template'
+SCHEDULED_OCCURRENCE_FIELD = 'Scheduled Occurrence'
+
+# occurrences less than this many days apart share a single dated clone query
+OCCURRENCE_CLUSTER_DAYS = 7
 
 
 # ————————————————————————— Decorators —————————————————————————
 
-def cache_async(async_func):
-    _cache = {}
+def _freeze(value: Any) -> Any:
+    """Converts a value into an exact, hashable cache key. Containers are frozen
+    recursively and every leaf keeps its type so that 1, 1.0 and True don't collide.
+    """
+    if isinstance(value, dict):
+        items = sorted(((_freeze(k), _freeze(v)) for k, v in value.items()), key=repr)
+        return (dict, tuple(items))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_freeze(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return (frozenset, frozenset(_freeze(v) for v in value))
+    if isinstance(value, type):
+        return value
+    if isinstance(value, BaseModel) and (type(value).__hash__ is None):
+        return (type(value), value.model_dump_json())
+    hash(value)  # raises a TypeError for anything else that can't be a key
+    return (type(value), value)
+
+
+def cache_async(async_func=None, *, maxsize: Optional[int]=128, ttl: Optional[float]=None):
+    """Memoizes an async function. Keys are built from the exact arguments, entries
+    are evicted least recently used once maxsize is reached and expire after ttl
+    seconds. Concurrent calls with the same arguments share a single in flight call.
+    Can be used bare as @cache_async or configured as @cache_async(maxsize=..., ttl=...).
+    """
+    if async_func is None:
+        return lambda func: cache_async(func, maxsize=maxsize, ttl=ttl)
+
+    _cache: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+    _in_flight: dict[Any, asyncio.Task] = {}
+    _stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0}
+    _name = getattr(async_func, '__qualname__', repr(async_func))
+
+    async def call(key, args, kwargs):
+        try:
+            result = await async_func(*args, **kwargs)
+            expires = math.inf if ttl is None else time.monotonic() + ttl
+            _cache[key] = (expires, result)
+            while (maxsize is not None) and (len(_cache) > maxsize):
+                _cache.popitem(last=False)
+                _stats['evictions'] += 1
+            return result
+        finally:
+            del _in_flight[key]
+
+    @functools.wraps(async_func)
     async def wrapper(*args, **kwargs):
-        key = list(args)
-        key.extend([(k, v) for k, v in kwargs.items()])
-        key = hash(tuple(key))
-        if key in _cache.keys():
-            result = _cache[key]
+        key = (_freeze(args), _freeze(kwargs))
+        if key in _cache:
+            expires, result = _cache[key]
+            if expires > time.monotonic():
+                _cache.move_to_end(key)
+                _stats['hits'] += 1
+                telemetry.count('scheduler.cache.requests', cache=_name, result='hit')
+                return result
+            del _cache[key]
+        if key in _in_flight:
+            _stats['coalesced'] += 1
         else:
-            result = await async_func(*args, **kwargs)
-            _cache[key] = result
-        return result
-    wrapper._cache = _cache
+            _stats['misses'] += 1
+            telemetry.count('scheduler.cache.requests', cache=_name, result='miss')
+            _in_flight[key] = asyncio.ensure_future(call(key, args, kwargs))
+        # shielded so that one cancelled caller doesn't cancel the call for the others
+        return await asyncio.shield(_in_flight[key])
+
+    def cache_info() -> dict:
+        return {**_stats, 'size': len(_cache)}
+
+    def cache_clear():
+        _cache.clear()
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
+    _cached_functions.append(wrapper)
     return wrapper
 
 
+def cache_stats() -> dict[str, dict]:
+    """Returns the hit/miss statistics for every function wrapped by cache_async.
+    """
+    return {func.__qualname__: func.cache_info() for func in _cached_functions}
+
+
 # ————————————————————————— Models —————————————————————————
 
 class WorkPackageType(BaseModel):
@@ -60,19 +152,53 @@ class Project(BaseModel):
         return self.id
 
     @classmethod
-    @cache_async
+    @cache_async(ttl=METADATA_TTL)
     async def query_projects(cls, filters: Optional[dict]=None) -> list[Self]:
         data = await com.query_projects(filters)
         projects = [cls(**obj) for obj in data['_embedded']['elements']]
         return projects
 
-    @cache_async
+    @cache_async(maxsize=1024, ttl=METADATA_TTL)
     async def query_work_package_types(self) -> list[WorkPackageType]:
         data = await com.query_work_package_types(self.id)
         types = [WorkPackageType(**obj) for obj in data['_embedded']['elements']]
         return types
 
 
+class ProjectIndex(BaseModel):
+    """Projects keyed by id and by name. It is built once per run and shared by every
+    clone so that resolving a target project is a lookup rather than a scan.
+    """
+
+    by_id: dict[int, Project] =         Field(default_factory=dict)
+    by_name: dict[str, list[Project]] = Field(default_factory=dict)
+
+    @classmethod
+    async def build(cls) -> Self:
+        projects = await Project.query_projects()
+        by_name = defaultdict(list)
+        for p in projects:
+            by_name[p.name].append(p)
+        return cls(by_id={p.id: p for p in projects}, by_name=dict(by_name))
+
+    def resolve(self, link: dict) -> Project:
+        """Returns the project a link points to. The id in the href is used when
+        there is one, otherwise the project is looked up by its title.
+        """
+        # the href keeps any subpath openproject is served under
+        match = re.search(r'/api/v3/projects/(\d+)$', link.get('href') or '')
+        if match is not None:
+            project_id = int(match.group(1))
+            if project_id not in self.by_id:
+                raise ValueError(f'Failed to find project {project_id}')
+            return self.by_id[project_id]
+        title = link.get('title')
+        projects = self.by_name.get(title, [])
+        if len(projects) != 1:
+            raise ValueError(f'Found {len(projects)} projects named {title!r}, expected exactly one')
+        return projects[0]
+
+
 class WorkPackageSchema(BaseModel):
     """Class that represents a schema for a work package.
     Note, the schemas are made to sanitize the template when
@@ -102,11 +228,14 @@ class WorkPackageSchema(BaseModel):
         return self.schema_id[1]
 
     @classmethod
-    @cache_async
+    @cache_async(maxsize=4096, ttl=METADATA_TTL)
     async def query_work_package_schema(cls, project_id: int, work_package_type_id: int) -> Self:
+        # the raw schema may come from the persistent metadata cache, building the
+        # model from it restores the custom field name map on a warm run
         data = await com.query_work_package_schema(project_id, work_package_type_id)
         schema = cls(**data)
         schema._update_custom_field_name_map()
+        schema.read_only_fields  # computed once here so every clone built from the schema reuses it
         return schema
 
     def _update_custom_field_name_map(self):
@@ -114,6 +243,15 @@ class WorkPackageSchema(BaseModel):
         custom_fields = {v['name']: k for k, v in self.model_dump().items() if fullmatch(pattern, k)}
         self.custom_field_name_map.update(custom_fields)
 
+    @functools.cached_property
+    def read_only_fields(self) -> frozenset[str]:
+        """Returns the attributes and links the schema marks as not writable.
+        """
+        return frozenset(
+            key for key, obj in self.model_dump(by_alias=True).items()
+            if isinstance(obj, dict) and obj.get('writable') == False  # noqa: E712
+        )
+
     def __getitem__(self, key: str):
         key = self.custom_field_name_map.get(key, key)
         return getattr(self, key)
@@ -151,11 +289,19 @@ class WorkPackageRelation(BaseModel):
         self.link['from']['href'] = '/'.join(parts)
 
     @classmethod
-    async def query_work_package_relations(cls, filters: Optional[dict]=None) -> list[Self]:
-        data = await com.query_work_package_relations(filters=filters)
+    async def query_work_package_relations(cls, filters: Optional[dict]=None, select: Optional[list[str]]=None) -> list[Self]:
+        data = await com.query_work_package_relations(filters=filters, select=select)
         relations = [cls(**obj) for obj in data['_embedded']['elements']]
         return relations
 
+    @classmethod
+    async def iter_work_package_relations(cls, filters: Optional[dict]=None, select: Optional[list[str]]=None) -> AsyncIterator[Self]:
+        """Yields relations page by page instead of loading them all at once.
+        """
+        async for data in com.iter_work_package_relations(filters=filters, select=select):
+            for obj in data['_embedded']['elements']:
+                yield cls(**obj)
+
     def build_work_package_relation_payload(self) -> dict:
         return self.model_dump(by_alias=True, exclude_none=True)
 
@@ -186,6 +332,14 @@ class WorkPackage(BaseModel):
     def schema_id(self) -> tuple[int, int]:
         return (self.project_id, self.type_id)
 
+    @property
+    def status_id(self) -> int:
+        return int(self.links['status']['href'].split('/')[-1])
+
+    @property
+    def scheduled_date(self) -> date | None:
+        return self.startDate or self.dueDate or self.date_
+
     def __getitem__(self, key: str):
         key = WorkPackageSchema.custom_field_name_map.get(key, key)
         if key in self.links.keys():
@@ -205,21 +359,168 @@ class WorkPackage(BaseModel):
         return getattr(self, key, fallback)
 
     @classmethod
-    async def query_work_packages(cls, filters: Optional[dict]=None) -> list[Self]:
-        data = await com.query_work_packages(filters=filters)
+    async def query_work_packages(cls, filters: Optional[dict]=None, select: Optional[list[str]]=None) -> list[Self]:
+        """Returns the work packages matching filters. If select is given the server
+        only returns those fields, so it must include the ones the model requires.
+        """
+        data = await com.query_work_packages(filters=filters, select=select)
         work_packages = [cls(**obj) for obj in data['_embedded']['elements']]
         return work_packages
 
+    @classmethod
+    async def iter_work_packages(cls, filters: Optional[dict]=None, select: Optional[list[str]]=None) -> AsyncIterator[Self]:
+        """Yields work packages page by page so callers can filter them as they
+        arrive instead of holding the full result set in memory.
+        """
+        async for data in com.iter_work_packages(filters=filters, select=select):
+            for obj in data['_embedded']['elements']:
+                yield cls(**obj)
+
     def build_work_package_payload(self, schema: WorkPackageSchema) -> dict:
+        read_only = schema.read_only_fields
         payload = self.model_dump(by_alias=True, exclude_none=True)
-        schema_data = schema.model_dump(by_alias=True)
-        for key, obj in schema_data.items():
-            if isinstance(obj, dict) and obj.get('writable') == False:  # noqa: E712
-                if key in payload.keys():
-                    del payload[key]
-                elif key in payload['_links'].keys():
-                    del payload['_links'][key]
-        return payload
+        # a read only key names an attribute if there is one, otherwise a link
+        payload['_links'] = {k: v for k, v in payload['_links'].items() if (k not in read_only) or (k in payload)}
+        return {k: v for k, v in payload.items() if k not in read_only}
+
+
+def _href_id(links: dict, name: str) -> Optional[int]:
+    """Returns the id at the end of a link's href, or None if there is no link.
+    """
+    href = (links.get(name) or {}).get('href')
+    return None if href is None else int(href.rsplit('/', 1)[-1])
+
+
+def _parse_date(value: Optional[str | date]) -> Optional[date]:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+class WorkPackageSummary:
+    """Light weight, read only projection of a work package that only holds what is
+    needed to match clones to templates. Ids and dates are parsed once when the json
+    is read, and slots keep each record small when scanning large clone histories.
+    Queries made through it use the select parameter so the server skips the
+    remaining links and custom fields.
+    """
+
+    SELECT: ClassVar[list[str]] = ['id', 'startDate', 'dueDate', 'date', 'status', 'project', 'type']
+
+    __slots__ = ('id', 'status_id', 'project_id', 'type_id', 'start_date', 'due_date', 'date_',
+                 'source_template_id', 'scheduled_occurrence')
+
+    def __init__(self, id: int, status_id: Optional[int]=None, project_id: Optional[int]=None,
+                 type_id: Optional[int]=None, start_date: Optional[date]=None, due_date: Optional[date]=None,
+                 date_: Optional[date]=None, source_template_id: Optional[int]=None,
+                 scheduled_occurrence: Optional[date]=None):
+        self.id = id
+        self.status_id = status_id
+        self.project_id = project_id
+        self.type_id = type_id
+        self.start_date = start_date
+        self.due_date = due_date
+        self.date_ = date_
+        self.source_template_id = source_template_id
+        self.scheduled_occurrence = scheduled_occurrence
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(id={self.id}, scheduled_date={self.scheduled_date})'
+
+    @classmethod
+    def from_json(cls, obj: dict) -> Self:
+        """Builds a summary from a work package as returned by the api.
+        """
+        links = obj.get('_links') or {}
+        source_template_id, scheduled_occurrence = obj.get('source_template_id'), obj.get('scheduled_occurrence')
+        # the provenance fields arrive under their customFieldN keys
+        keys = provenance_keys()
+        if keys is not None:
+            source_key, occurrence_key = keys
+            source_template_id = obj.get(source_key, source_template_id)
+            scheduled_occurrence = obj.get(occurrence_key, scheduled_occurrence)
+        return cls(
+            id=obj['id'],
+            status_id=_href_id(links, 'status'),
+            project_id=_href_id(links, 'project'),
+            type_id=_href_id(links, 'type'),
+            start_date=_parse_date(obj.get('startDate')),
+            due_date=_parse_date(obj.get('dueDate')),
+            date_=_parse_date(obj.get('date')),
+            source_template_id=source_template_id,
+            scheduled_occurrence=_parse_date(scheduled_occurrence),
+        )
+
+    def to_json(self) -> dict:
+        """Returns the summary in the shape from_json reads, used for snapshots.
+        """
+        links = {
+            name: {'href': f'/api/v3/{collection}/{value}'}
+            for name, collection, value in (
+                ('status', 'statuses', self.status_id),
+                ('project', 'projects', self.project_id),
+                ('type', 'types', self.type_id),
+            ) if value is not None
+        }
+        dates = {'startDate': self.start_date, 'dueDate': self.due_date, 'date': self.date_,
+                 'scheduled_occurrence': self.scheduled_occurrence}
+        return {
+            'id': self.id,
+            '_links': links,
+            'source_template_id': self.source_template_id,
+            **{k: (None if v is None else v.isoformat()) for k, v in dates.items()}
+        }
+
+    @property
+    def scheduled_date(self) -> date | None:
+        return self.scheduled_occurrence or self.start_date or self.due_date or self.date_
+
+    @classmethod
+    def select(cls) -> list[str]:
+        return cls.SELECT + list(provenance_keys() or [])
+
+    @classmethod
+    async def query_work_packages(cls, filters: Optional[dict]=None) -> list[Self]:
+        data = await com.query_work_packages(filters=filters, select=cls.select())
+        return [cls.from_json(obj) for obj in data['_embedded']['elements']]
+
+    @classmethod
+    async def iter_work_packages(cls, filters: Optional[dict]=None) -> AsyncIterator[Self]:
+        async for data in com.iter_work_packages(filters=filters, select=cls.select()):
+            for obj in data['_embedded']['elements']:
+                yield cls.from_json(obj)
+
+
+class RelationSummary:
+    """Read only projection of a relation with the ids of both ends parsed once, used
+    to map clones back to their templates.
+    """
+
+    SELECT: ClassVar[list[str]] = ['id', 'from', 'to']
+
+    __slots__ = ('id', 'from_', 'to')
+
+    def __init__(self, id: Optional[int], from_: int, to: int):
+        self.id = id
+        self.from_ = from_
+        self.to = to
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(id={self.id}, from_={self.from_}, to={self.to})'
+
+    @classmethod
+    def from_json(cls, obj: dict) -> Self:
+        links = obj['_links']
+        return cls(obj.get('id'), _href_id(links, 'from'), _href_id(links, 'to'))
+
+    @classmethod
+    async def query_relations(cls, filters: Optional[dict]=None) -> list[Self]:
+        data = await com.query_work_package_relations(filters=filters, select=cls.SELECT)
+        return [cls.from_json(obj) for obj in data['_embedded']['elements']]
+
+    @classmethod
+    async def iter_relations(cls, filters: Optional[dict]=None) -> AsyncIterator[Self]:
+        async for data in com.iter_work_package_relations(filters=filters, select=cls.SELECT):
+            for obj in data['_embedded']['elements']:
+                yield cls.from_json(obj)
 
 
 class WorkPackageCloneInfo(BaseModel):
@@ -227,39 +528,43 @@ class WorkPackageCloneInfo(BaseModel):
     template: WorkPackage =         Field()
     modifications: dict[str, Any] = Field()
 
-    async def create_clone(self) -> WorkPackage:
-        try:
-            logging.debug('creating clone from work package %d', self.template.id)
-            # create a copy of the template
-            clone = self.template.model_copy()
-            # apply the modifications
-            for key, val in self.modifications.items():
-                clone[key] = val
-            # get the schema to build the work package payload
-            projects = await Project.query_projects()
-            try:
-                project = [p for p in projects if p.name == clone['Target Project']['title']][0]
-            except IndexError:
-                raise ValueError(f'Failed to find a target workpackge for clone with {self.template.id=}')
-            schema = await WorkPackageSchema.query_work_package_schema(project.id, clone.type_id)
-            payload = clone.build_work_package_payload(schema)
-            # create the new work package
-            data = await com.create_work_package(project.id, payload)
-            new_work_package = WorkPackage(**data)
-            relation = WorkPackageRelation(**{
-                '_links': {
-                    'from': {'href': f'/api/v3/work_packages/{new_work_package.id}'},
-                    'to': {'href': f'/api/v3/work_packages/{self.template.id}'}
-                },
-                'name': 'duplicates',
-                'type': 'duplicates',
-                'reverseType': 'duplicated'
-            })
-            payload = relation.build_work_package_relation_payload()
-            await com.create_relation(new_work_package.id, payload)
-            return new_work_package
-        except Exception as e:
-            logger.exception(f'failed to create clone with {self.template.id=}')
+    async def create_clone(self, projects: Optional[ProjectIndex]=None, config: com.APIConfig=com.APIConfig.from_env()) -> WorkPackage:
+        """Creates the clone and links it to its template. Pass the run's project index
+        when creating a batch of clones so they share a single lookup table. Failures
+        are raised so the caller can report them and leave the template as it was.
+        """
+        logging.debug('creating clone from work package %d', self.template.id)
+        # create a copy of the template
+        clone = self.template.model_copy()
+        # apply the modifications
+        for key, val in self.modifications.items():
+            clone[key] = val
+        # get the schema to build the work package payload
+        if projects is None:
+            projects = await ProjectIndex.build()
+        project = projects.resolve(clone['Target Project'])
+        schema = await WorkPackageSchema.query_work_package_schema(project.id, clone.type_id)
+        # stamp the clone with where it came from so the index can skip the relations query
+        has_fields = all(schema.get(field) is not None for field in (SOURCE_TEMPLATE_FIELD, SCHEDULED_OCCURRENCE_FIELD))
+        if config.provenance_fields and (provenance_keys() is not None) and has_fields:
+            clone[SOURCE_TEMPLATE_FIELD] = self.template.id
+            clone[SCHEDULED_OCCURRENCE_FIELD] = clone.scheduled_date
+        payload = clone.build_work_package_payload(schema)
+        # create the new work package
+        data = await com.create_work_package(project.id, payload)
+        new_work_package = WorkPackage(**data)
+        relation = WorkPackageRelation(**{
+            '_links': {
+                'from': {'href': f'/api/v3/work_packages/{new_work_package.id}'},
+                'to': {'href': f'/api/v3/work_packages/{self.template.id}'}
+            },
+            'name': 'duplicates',
+            'type': 'duplicates',
+            'reverseType': 'duplicated'
+        })
+        payload = relation.build_work_package_relation_payload()
+        await com.create_relation(new_work_package.id, payload)
+        return new_work_package
 
 
 class WorkPackageTemplateInfo(BaseModel):
@@ -280,10 +585,538 @@ class WorkPackageSchedulingInfo(BaseModel):
     clone_info: Optional[WorkPackageCloneInfo] =        Field(None)
     template_info: Optional[WorkPackageTemplateInfo] =  Field(None)
 
+    async def apply(self, projects: Optional[ProjectIndex]=None):
+        """Creates the clone and then updates the template, the same order a full
+        run applies them in. The template is left alone if the clone fails, so the
+        clone is retried by the next run.
+        """
+        if self.clone_info is not None:
+            template_id = self.clone_info.template.id
+            with telemetry.span('create clone', **{'scheduler.template_id': template_id}):
+                await self.clone_info.create_clone(projects)
+            telemetry.count('scheduler.clones.created', algorithm=scheduling_algorithm(self.clone_info.template) or '')
+        if self.template_info is not None:
+            with telemetry.span('update template', **{'scheduler.template_id': self.template_info.template.id}):
+                await self.template_info.update_template()
+
+    def plan(self, projects: ProjectIndex) -> dict:
+        """Returns what apply would do as a json serializable dict, without doing it.
+        """
+        plan = {}
+        if self.clone_info is not None:
+            template = self.clone_info.template
+            clone = template.model_copy()
+            for key, val in self.clone_info.modifications.items():
+                clone[key] = val
+            try:
+                target = projects.resolve(clone['Target Project'])
+                target_project = {'id': target.id, 'name': target.name}
+            except ValueError as e:
+                target_project = {'error': str(e)}
+            plan['clone'] = {
+                'template_id': template.id,
+                'subject': template.subject,
+                'algorithm': scheduling_algorithm(template),
+                'target_project': target_project,
+                'modifications': self.clone_info.modifications,
+            }
+        if self.template_info is not None:
+            plan['template_update'] = {
+                'template_id': self.template_info.template.id,
+                'modifications': self.template_info.modifications,
+            }
+        return plan
+
+
+class CloneIndex(BaseModel):
+    """Maps template ids to the clones that duplicate them. It is built once per run
+    and then shared by every scheduling algorithm, so the number of api calls doesn't
+    grow with the number of algorithms. Only the clones that can affect scheduling
+    are fetched, open clones for templates without an upcoming occurrence (Fixed Delay)
+    and clones dated on or right around each upcoming occurrence for the rest. When
+    clones carry the provenance fields they are keyed by those directly, without the
+    relations query.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    clones: dict[int, list[WorkPackageSummary]] =   Field(default_factory=dict)
+    open_clone_ids: frozenset[int] =                Field(frozenset())
+
+    @classmethod
+    async def build(cls, templates: list[WorkPackage], occurrences: dict[int, date], config: com.APIConfig=com.APIConfig.from_env()) -> Self:
+        template_ids = [t.id for t in templates]
+        # short circuit evaluation
+        if not template_ids:
+            return cls()
+
+        keys = provenance_keys() if config.provenance_fields else None
+        if config.provenance_fields and (keys is None):
+            logging.warning('the %r and %r custom fields were not found, falling back to relations',
+                            SOURCE_TEMPLATE_FIELD, SCHEDULED_OCCURRENCE_FIELD)
+
+        # queries for duplicates so we can get the info on them, letting the server
+        # filter out the clone history that can't affect scheduling. Clones created before
+        # the provenance fields existed, or in schemas without them, are never stamped and
+        # are still found through the duplicates relation
+        async def query_duplicates(ids: list[int], filters: list[dict], stamped: bool) -> dict[int, WorkPackageSummary]:
+            if not ids:
+                return {}
+            if stamped:
+                filters = [{keys[0]: {'operator': '=', 'values': [str(i) for i in ids]}}, *filters]
+            else:
+                filters = [{'duplicates': {'operator': '=', 'values': ids}}, *filters]
+                if keys is not None:
+                    filters.append({keys[0]: {'operator': '!*', 'values': None}})
+            return {d.id: d async for d in WorkPackageSummary.iter_work_packages(filters=filters)}
+
+        # dated clones are only fetched on or right around the occurrences of their templates
+        undated_ids = [i for i in template_ids if i not in occurrences]
+        clusters = cluster_occurrences({i: occurrences[i] for i in template_ids if i in occurrences})
+        async def query_clones(stamped: bool) -> tuple[dict[int, WorkPackageSummary], dict[int, WorkPackageSummary]]:
+            date_field = keys[1] if stamped else 'startDate'
+            open_duplicates, *dated_duplicates = await asyncio.gather(
+                query_duplicates(undated_ids, [{'status_id': {'operator': 'o', 'values': None}}], stamped),
+                *[query_duplicates(ids, [occurrence_filter(date_field, first, last)], stamped) for ids, first, last in clusters]
+            )
+            duplicates = {k: v for d in dated_duplicates for k, v in d.items()}
+            duplicates.update(open_duplicates)
+            return open_duplicates, duplicates
+
+        if keys is None:
+            (open_duplicates, unstamped), stamped = await query_clones(False), {}
+        else:
+            (open_stamped, stamped), (open_unstamped, unstamped) = await asyncio.gather(query_clones(True), query_clones(False))
+            open_duplicates = {**open_stamped, **open_unstamped}
+        duplicates = {**stamped, **unstamped}
+
+        clones = defaultdict(list)
+        for d in stamped.values():
+            clones[d.source_template_id].append(d)
+        # query the relations so we can link unstamped duplicates to templates with short circuiting
+        if unstamped:
+            filters = [
+                {'to': {'operator': '=', 'values': template_ids}},
+                {'from': {'operator': '=', 'values': list(unstamped.keys())}},
+                {'type': {'operator': '=', 'values': ['duplicates']}}
+            ]
+            async for r in RelationSummary.iter_relations(filters=filters):
+                if r.from_ in unstamped:
+                    clones[r.to].append(unstamped[r.from_])
+
+        logging.debug('%d clones of %d templates indexed', len(duplicates), len(clones))
+        return cls(clones=dict(clones), open_clone_ids=frozenset(open_duplicates.keys()))
+
+    @classmethod
+    def from_snapshot(cls, records: list[tuple[int, bool, dict]]) -> Self:
+        """Builds the index from the (template id, is open, clone data) records
+        stored by incremental sync.
+        """
+        clones = defaultdict(list)
+        open_clone_ids = set()
+        for template_id, is_open, data in records:
+            clone = WorkPackageSummary.from_json(data)
+            clones[template_id].append(clone)
+            if is_open:
+                open_clone_ids.add(clone.id)
+        return cls(clones=dict(clones), open_clone_ids=frozenset(open_clone_ids))
+
+    def to_snapshot(self) -> list[tuple[int, bool, dict]]:
+        return [
+            (template_id, c.id in self.open_clone_ids, c.to_json())
+            for template_id, clones in self.clones.items() for c in clones
+        ]
+
+    def clones_of(self, template_id: int) -> list[WorkPackageSummary]:
+        return self.clones.get(template_id, [])
+
+    def open_clones_of(self, template_id: int) -> list[WorkPackageSummary]:
+        return [c for c in self.clones_of(template_id) if c.id in self.open_clone_ids]
+
+    def has_clone_on(self, template_id: int, on: date) -> bool:
+        return any(c.scheduled_date == on for c in self.clones_of(template_id))
+
 
 # ————————————————————————— Module Methods —————————————————————————
 
-async def calculate_scheduling_infos() -> list[WorkPackageSchedulingInfo]:
+_sync_snapshots: dict[com.APIConfig, SyncSnapshot] = {}
+
+
+def get_sync_snapshot(config: com.APIConfig=com.APIConfig.from_env()) -> SyncSnapshot:
+    """Returns the snapshot used by incremental sync for the config.
+    """
+    if config not in _sync_snapshots:
+        _sync_snapshots[config] = SyncSnapshot(config.snapshot_path)
+    return _sync_snapshots[config]
+
+
+_due_indexes: dict[com.APIConfig, DueIndex] = {}
+
+
+def get_due_index(config: com.APIConfig=com.APIConfig.from_env()) -> DueIndex:
+    """Returns the index of template due dates for the config.
+    """
+    if config not in _due_indexes:
+        _due_indexes[config] = DueIndex(config.due_index_path)
+    return _due_indexes[config]
+
+
+def provenance_keys() -> Optional[tuple[str, str]]:
+    """Returns the customFieldN keys of the source template and scheduled occurrence
+    fields, or None unless both have been seen on a schema.
+    """
+    source_key = WorkPackageSchema.custom_field_name_map.get(SOURCE_TEMPLATE_FIELD)
+    occurrence_key = WorkPackageSchema.custom_field_name_map.get(SCHEDULED_OCCURRENCE_FIELD)
+    if (source_key is None) or (occurrence_key is None):
+        return None
+    return source_key, occurrence_key
+
+
+def cluster_occurrences(occurrences: dict[int, date], days: int=OCCURRENCE_CLUSTER_DAYS) -> list[tuple[list[int], date, date]]:
+    """Groups templates by occurrence into clusters spanning less than the given days,
+    returning the template ids and the first and last occurrence of each cluster.
+    """
+    clusters = []
+    for template_id, on in sorted(occurrences.items(), key=lambda item: item[1]):
+        if clusters and ((on - clusters[-1][1]).days < days):
+            clusters[-1][0].append(template_id)
+            clusters[-1][2] = on
+        else:
+            clusters.append([[template_id], on, on])
+    return [tuple(c) for c in clusters]
+
+
+def occurrence_filter(field: str, first: date, last: date) -> dict:
+    """Returns the filter matching work packages on a date, or between two dates.
+    """
+    if first == last:
+        return {field: {'operator': '=d', 'values': [first.isoformat()]}}
+    return {field: {'operator': '<>d', 'values': [first.isoformat(), last.isoformat()]}}
+
+
+def scheduling_algorithm(template: WorkPackage) -> Optional[str]:
+    """Returns the name of the template's auto scheduling algorithm, if any.
+    """
+    return (template.get('Auto Scheduling Algorithm') or {}).get('title')
+
+
+def next_fixed_interval_date(template: WorkPackage, today: date) -> date:
+    start = template['startDate'] or template['date_']
+    delta: timedelta = today - start
+    interval = template['Interval/Day Of Month']
+    remainder = timedelta(days = interval - (delta.days % interval))
+    return start + delta + remainder
+
+
+def next_fixed_day_of_month_date(template: WorkPackage, today: date) -> date:
+    day = template['Interval/Day Of Month']
+    # if day is in the past look to next months
+    next_date = today.replace(day=day)
+    if next_date <= today:
+        next_date = next_date + relativedelta(months=1)
+    return next_date
+
+
+def next_fixed_day_of_year_date(template: WorkPackage, today: date) -> date:
+    return template.scheduled_date.replace(year=today.year)
+
+
+def next_weather_forecast_date(template: WorkPackage, today: date) -> date:
+    return today
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_weather_conditions(conditions: str) -> tuple[tuple[str, float], ...]:
+    """Returns the (parameter, max allowed value) pairs of a template's Weather
+    Conditions json. Parsed conditions are cached by their text, so unchanged
+    templates are only parsed once.
+    """
+    return tuple(
+        (param, float(value)) for param, value in json.loads(conditions).items()
+        if (value is not None) and (param not in ('latitude', 'longitude'))
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_weather_location(conditions: str) -> Optional[tuple[float, float]]:
+    """Returns the location set by the latitude and longitude keys of a template's
+    Weather Conditions json, or None to use the configured location.
+    """
+    conditions = json.loads(conditions)
+    if ('latitude' not in conditions) or ('longitude' not in conditions):
+        return None
+    return float(conditions['latitude']), float(conditions['longitude'])
+
+
+def weather_location(template: WorkPackage) -> Optional[tuple[float, float]]:
+    try:
+        return parse_weather_location(template['Weather Conditions'])
+    except (TypeError, ValueError, AttributeError):
+        return None  # invalid conditions are reported when they are evaluated
+
+
+def forecast_prefix_maxima(minutely_15: dict[str, list]) -> dict[str, np.ndarray]:
+    """Returns the running maximum of every numeric forecast series, so the max over
+    any horizon is a single lookup. Missing values are ignored.
+    """
+    maxima = {}
+    for param, values in minutely_15.items():
+        try:
+            array = np.array(values, dtype=float)  # None becomes nan
+        except (TypeError, ValueError):
+            continue  # not a numeric series, like time
+        maxima[param] = np.fmax.accumulate(array) if array.size else array
+    return maxima
+
+
+def evaluate_weather_conditions(templates: list[WorkPackage], maxima: dict[str, np.ndarray]) -> np.ndarray:
+    """Returns whether each template's weather conditions are exceeded within its
+    horizon, evaluating every template in one pass per forecast parameter.
+    """
+    # quarter hours in each horizon, the last quarter hour of the horizon is excluded
+    horizons = np.array([max(0, t['Interval/Day Of Month'] * 24 * 4 - 1) for t in templates], dtype=int)
+    thresholds = {param: np.full(len(templates), np.nan) for param in maxima}
+    for i, t in enumerate(templates):
+        try:
+            conditions = parse_weather_conditions(t['Weather Conditions'])
+        except (TypeError, ValueError, AttributeError):
+            logging.warning('Invalid weather conditions on template %d, skipping it', t.id)
+            continue
+        for param, value in conditions:
+            if param in thresholds:
+                thresholds[param][i] = value
+
+    detected = np.zeros(len(templates), dtype=bool)
+    for param, prefix in maxima.items():
+        if not prefix.size:
+            continue
+        idx = np.minimum(horizons, prefix.size)
+        values = prefix[np.maximum(idx - 1, 0)]
+        # comparisons with nan are false, so missing thresholds and data never match
+        with np.errstate(invalid='ignore'):
+            detected |= (idx > 0) & (values > thresholds[param])
+    return detected
+
+
+# the date whose clone decides if a template needs scheduling, by algorithm
+NEXT_OCCURRENCE_FUNCTIONS = {
+    'Fixed Interval':       next_fixed_interval_date,
+    'Fixed Day Of Month':   next_fixed_day_of_month_date,
+    'Fixed Day Of Year':    next_fixed_day_of_year_date,
+    'Weather Forecast':     next_weather_forecast_date,
+}
+
+
+def calculate_occurrences(templates: list[WorkPackage]) -> dict[int, date]:
+    """Returns the next occurrence date for every template that has one. Invalid
+    configs are skipped here and reported by the algorithm's calculator.
+    """
+    today = date.today()
+    occurrences = {}
+    for t in templates:
+        func = NEXT_OCCURRENCE_FUNCTIONS.get(scheduling_algorithm(t))
+        try:
+            if func is not None:
+                occurrences[t.id] = func(t, today)
+        except (TypeError, ValueError, AttributeError, KeyError):
+            pass
+    return occurrences
+
+
+def calculate_due_date(template: WorkPackage, occurrence: date, today: date) -> Optional[date]:
+    """Returns the first day on which the template's next occurrence moves on, which is
+    the earliest it can need another clone. Returns None for algorithms that depend on
+    more than the date, such as Weather Forecast.
+    """
+    algorithm = scheduling_algorithm(template)
+    if algorithm in ('Fixed Interval', 'Fixed Day Of Month'):
+        return occurrence
+    if algorithm == 'Fixed Day Of Year':
+        # the occurrence is pinned to the current year so it only moves on new year's day
+        return date(today.year + 1, 1, 1)
+    return None
+
+
+def schedule_due_dates(due_index: DueIndex, templates: list[WorkPackage], clone_index: CloneIndex):
+    """Stores the due date of every template whose next occurrence already has a clone.
+    Templates that are getting a clone this run are stored on the next run, once the
+    clone is known to exist.
+    """
+    today = date.today()
+    occurrences = calculate_occurrences(templates)
+    entries = []
+    for t in templates:
+        occurrence = occurrences.get(t.id)
+        due = None if occurrence is None else calculate_due_date(t, occurrence, today)
+        if (due is not None) and clone_index.has_clone_on(t.id, occurrence):
+            entries.append((t.id, due, t.get('lockVersion')))
+    due_index.schedule(entries)
+    logging.debug('%d templates scheduled in the due index', len(entries))
+
+
+async def query_changed_due_templates(due_index: DueIndex, dry_run: bool=False) -> set[int]:
+    """Returns the ids of the templates in the due index with a clone that was created,
+    edited or closed since the last check, and drops their entries so they are looked
+    at again this run. A dry run only returns the ids, leaving the index as it was.
+    Deleted clones leave nothing to find and are only noticed once the template is due.
+    """
+    not_due = list(due_index.not_due(date.today()))
+    started = datetime.now(timezone.utc)
+    checked = due_index.get_state('checked')
+    if not not_due:
+        changed = set()
+    elif checked is None:
+        # entries from before the first check may already be stale
+        changed = set(not_due)
+    else:
+        # overlap the previous check slightly so clock skew can't hide an update
+        since = datetime.fromisoformat(checked) - timedelta(minutes=5)
+        filters = [
+            {'duplicates': {'operator': '=', 'values': not_due}},
+            {'updatedAt': {'operator': '<>d', 'values': [since.strftime('%Y-%m-%dT%H:%M:%SZ'), '']}}
+        ]
+        clones = [c async for c in WorkPackageSummary.iter_work_packages(filters=filters)]
+        changed = {c.source_template_id for c in clones if c.source_template_id in not_due}
+        unstamped = [c.id for c in clones if c.source_template_id is None]
+        if unstamped:
+            filters = [
+                {'to': {'operator': '=', 'values': not_due}},
+                {'from': {'operator': '=', 'values': unstamped}},
+                {'type': {'operator': '=', 'values': ['duplicates']}}
+            ]
+            changed.update([r.to async for r in RelationSummary.iter_relations(filters=filters)])
+    if not dry_run:
+        due_index.remove(list(changed))
+        due_index.set_state('checked', started.isoformat())
+    logging.debug('%d templates in the due index have changed clones', len(changed))
+    return changed
+
+
+def skip_templates_not_due(due_index: DueIndex, templates: list[WorkPackage], changed: Iterable[int]=()) -> list[WorkPackage]:
+    """Returns the templates that are due today, have been edited since they were last
+    scheduled in the due index, or are in changed. Only the clone lookups and
+    calculations of the others are skipped, the templates themselves are still queried.
+    """
+    not_due = due_index.not_due(date.today())
+    for template_id in changed:
+        not_due.pop(template_id, None)
+    due = [t for t in templates if (t.id not in not_due) or (not_due[t.id] != t.get('lockVersion'))]
+    logging.debug('%d of %d templates are not due and were skipped', len(templates) - len(due), len(templates))
+    return due
+
+
+def filter_algorithms(templates: list[WorkPackage], algorithms: Optional[set[str]]=None) -> list[WorkPackage]:
+    """Returns the templates scheduled by one of the algorithms, or all of them if no
+    algorithms are specified.
+    """
+    if algorithms is None:
+        return templates
+    return [t for t in templates if scheduling_algorithm(t) in algorithms]
+
+
+def template_filters(schemas: list[WorkPackageSchema]) -> list[dict]:
+    """Returns the filters matching work packages in the projects and types of the schemas.
+    """
+    return [
+        {'project_id': {'operator': '=', 'values': list({s.project_id for s in schemas})}},
+        {'type': {'operator': '=', 'values': list({s.type_id for s in schemas})}}
+    ]
+
+
+async def query_templates(schemas: list[WorkPackageSchema]) -> list[WorkPackage]:
+    """Returns the open work packages in the projects and types of the schemas.
+    """
+    filters = [{'status_id': {'operator': 'o', 'values': None}}, *template_filters(schemas)]
+    templates = await WorkPackage.query_work_packages(filters=filters)
+    return templates
+
+
+async def sync_incremental(schemas: list[WorkPackageSchema], config: com.APIConfig=com.APIConfig.from_env(), dry_run: bool=False) -> tuple[list[WorkPackage], CloneIndex]:
+    """Returns the templates and clone index from a local snapshot, merging in only the
+    work packages updated since the watermark stored by the previous run. A full sync
+    replaces the snapshot on the first run and every config.full_resync_interval seconds
+    as a safety net for changes a delta can't see, such as deleted work packages. A dry
+    run merges into an in memory copy, leaving the stored snapshot and state as they were.
+    """
+    snapshot = get_sync_snapshot(config)
+    if dry_run:
+        snapshot = snapshot.copy()
+    started = datetime.now(timezone.utc)
+    watermark = snapshot.get_state('watermark')
+    full_sync = snapshot.get_state('full_sync')
+    is_full_sync = (watermark is None) or (full_sync is None) or \
+        ((started - datetime.fromisoformat(full_sync)).total_seconds() > config.full_resync_interval)
+
+    if is_full_sync:
+        logging.info('Running a full sync')
+        templates = await query_templates(schemas)
+        clone_index = await CloneIndex.build(templates, calculate_occurrences(templates), config)
+        snapshot.replace([t.model_dump(mode='json', by_alias=True) for t in templates], clone_index.to_snapshot(),
+                         {'full_sync': started.isoformat()})
+    else:
+        # overlap the previous run slightly so clock skew can't hide an update
+        since = datetime.fromisoformat(watermark) - timedelta(minutes=5)
+        updated = {'updatedAt': {'operator': '<>d', 'values': [since.strftime('%Y-%m-%dT%H:%M:%SZ'), '']}}
+        is_open = {'status_id': {'operator': 'o', 'values': None}}
+        is_closed = {'status_id': {'operator': 'c', 'values': None}}
+
+        # merge in the templates, dropping the ones that were closed
+        opened, closed = await asyncio.gather(
+            WorkPackage.query_work_packages(filters=[is_open, *template_filters(schemas), updated]),
+            WorkPackageSummary.query_work_packages(filters=[is_closed, *template_filters(schemas), updated])
+        )
+        known_ids = snapshot.template_ids()
+        snapshot.upsert_templates([t.model_dump(mode='json', by_alias=True) for t in opened])
+        snapshot.delete_templates([t.id for t in closed])
+        templates = [WorkPackage(**data) for data in snapshot.load_templates()]
+        logging.debug('%d templates updated and %d closed since %s', len(opened), len(closed), since)
+
+        # templates that were reopened or came into scope have clones the delta can't see
+        new_templates = [t for t in opened if t.id not in known_ids]
+        if new_templates:
+            new_index = await CloneIndex.build(new_templates, calculate_occurrences(new_templates), config)
+            snapshot.delete_clones_of([t.id for t in new_templates])
+            snapshot.upsert_clones(new_index.to_snapshot())
+            logging.debug('clones of %d new templates fetched', len(new_templates))
+
+        # merge in the clones, looking up the template only for clones not seen before
+        template_ids = [t.id for t in templates]
+        if template_ids:
+            duplicates = {'duplicates': {'operator': '=', 'values': template_ids}}
+            opened, closed = await asyncio.gather(
+                WorkPackageSummary.query_work_packages(filters=[is_open, duplicates, updated]),
+                WorkPackageSummary.query_work_packages(filters=[is_closed, duplicates, updated])
+            )
+            open_ids = {c.id for c in opened}
+            clone_templates = snapshot.clone_templates()
+            if config.provenance_fields:
+                clone_templates.update({
+                    c.id: c.source_template_id for c in chain(opened, closed)
+                    if (c.id not in clone_templates) and (c.source_template_id is not None)
+                })
+            new_ids = [c.id for c in chain(opened, closed) if c.id not in clone_templates]
+            if new_ids:
+                filters = [
+                    {'to': {'operator': '=', 'values': template_ids}},
+                    {'from': {'operator': '=', 'values': new_ids}},
+                    {'type': {'operator': '=', 'values': ['duplicates']}}
+                ]
+                async for r in RelationSummary.iter_relations(filters=filters):
+                    clone_templates[r.from_] = r.to
+            snapshot.upsert_clones([
+                (clone_templates[c.id], c.id in open_ids, c.to_json())
+                for c in chain(opened, closed) if c.id in clone_templates
+            ])
+            logging.debug('%d clones updated since %s, %d of them new', len(opened) + len(closed), since, len(new_ids))
+        clone_index = CloneIndex.from_snapshot(snapshot.load_clones())
+
+    snapshot.set_state('watermark', started.isoformat())
+    return templates, clone_index
+
+
+async def query_scheduling_schemas() -> list[WorkPackageSchema]:
+    """Returns the schemas of every project and type that have things to schedule.
+    """
     # query the projects and types to compute the schemas necessary
     projects = await Project.query_projects()
     types = await asyncio.gather(*[p.query_work_package_types() for p in projects])
@@ -292,28 +1125,63 @@ async def calculate_scheduling_infos() -> list[WorkPackageSchedulingInfo]:
 
     # filter to schemas that have things to schedule
     schemas = [s for s in schemas if s.get('Auto Scheduling Algorithm')]
-
-    # get work packages using schemas
-    filters = [
-        {'status_id': {'operator': 'o', 'values': None}},
-        {'project_id': {'operator': '=', 'values': list({s.project_id for s in schemas})}},
-        {'type': {'operator': '=', 'values': list({s.type_id for s in schemas})}}
-    ]
-    templates = await WorkPackage.query_work_packages(filters=filters)
+    return schemas
 
 
-    data = await asyncio.gather(
-        calculate_fixed_delay_scheduling_infos(templates),
-        calculate_fixed_interval_scheduling_infos(templates),
-        calculate_fixed_day_of_month_clone_infos(templates),
-        calculate_fixed_day_of_year_clone_infos(templates),
-        calculate_weather_dependent_clone_infos(templates)
-    )
-    scheduling_infos: list[WorkPackageSchedulingInfo] = list(chain(*data))
+async def calculate_scheduling_infos(config: com.APIConfig=com.APIConfig.from_env(), algorithms: Optional[set[str]]=None, queue: Optional[asyncio.Queue]=None, dry_run: bool=False) -> list[WorkPackageSchedulingInfo]:
+    """Returns the scheduling infos for every template, limited to the given
+    algorithms if any are specified. When a queue is given each scheduling info is
+    also put on it as soon as its algorithm finishes, so consumers don't have to
+    wait on the slowest algorithm. A dry run leaves the due index and the sync
+    snapshot untouched, since the infos it returns are never applied. Requests are attributed to the phase
+    that made them in the client's phase_stats.
+    """
+    with telemetry.span('query schemas'), com.attribute_requests('schemas'):
+        schemas = await query_scheduling_schemas()
+
+    # get the templates using schemas and look up their existing clones once for every algorithm
+    due_index = get_due_index(config) if config.due_index else None
+    changed = set()
+    if due_index is not None:
+        with telemetry.span('check due index'), com.attribute_requests('due index'):
+            changed = await query_changed_due_templates(due_index, dry_run)
+    if config.incremental_sync:
+        with telemetry.span('sync incremental'), com.attribute_requests('templates'):
+            templates, clone_index = await sync_incremental(schemas, config, dry_run)
+        templates = filter_algorithms(templates, algorithms)
+    else:
+        with telemetry.span('query templates'), com.attribute_requests('templates'):
+            templates = await query_templates(schemas)
+        templates = filter_algorithms(templates, algorithms)
+        if due_index is not None:
+            templates = skip_templates_not_due(due_index, templates, changed)
+        with telemetry.span('build clone index'), com.attribute_requests('clone index'):
+            clone_index = await CloneIndex.build(templates, calculate_occurrences(templates), config)
+    if config.incremental_sync and (due_index is not None):
+        templates = skip_templates_not_due(due_index, templates, changed)
+
+    calculators = {name: func for name, func in CALCULATORS.items() if (algorithms is None) or (name in algorithms)}
+
+    async def produce(name: str, func) -> list[WorkPackageSchedulingInfo]:
+        with telemetry.timed(f'calculate {name}', 'scheduler.algorithm.duration', algorithm=name), com.attribute_requests(name):
+            infos = await func(templates, clone_index)
+        if queue is not None:
+            for si in infos:
+                await queue.put(si)
+        return infos
+
+    # a failing algorithm cancels the others, rather than leaving them blocked on a full queue
+    async with asyncio.TaskGroup() as group:
+        tasks = [group.create_task(produce(name, func)) for name, func in calculators.items()]
+    scheduling_infos: list[WorkPackageSchedulingInfo] = list(chain(*[t.result() for t in tasks]))
+
+    if (due_index is not None) and (not dry_run):
+        with telemetry.span('schedule due dates'):
+            schedule_due_dates(due_index, templates, clone_index)
     return scheduling_infos
 
 
-async def calculate_fixed_delay_scheduling_infos(templates: list[WorkPackage]) -> list[WorkPackageSchedulingInfo]:
+async def calculate_fixed_delay_scheduling_infos(templates: list[WorkPackage], clone_index: CloneIndex) -> list[WorkPackageSchedulingInfo]:
     templates = [t for t in templates if t['Auto Scheduling Algorithm']['title'] == 'Fixed Delay']
 
     logging.debug('%d fixed delay schedule templates found', len(templates))
@@ -321,30 +1189,10 @@ async def calculate_fixed_delay_scheduling_infos(templates: list[WorkPackage]) -
     if not templates:
         return []
 
-    # queries for duplicated so we can get the info on them
-    filters = [
-        {'status_id': {'operator': 'o', 'values': None}},
-        {'duplicates': {'operator': '=', 'values': [t.id for t in templates]}}
-    ]
-    duplicates = await WorkPackage.query_work_packages(filters=filters)
-
-    # query the relations so we can link duplicated to templates with short circuiting
-    if not duplicates:
-        relations = []
-    else:
-        filters = [
-            {'to': {'operator': '=', 'values': [t.id for t in templates]}},
-            {'from': {'operator': '=', 'values': [d.id for d in duplicates]}},
-            {'type': {'operator': '=', 'values': ['duplicates']}}
-        ]
-        relations = await WorkPackageRelation.query_work_package_relations(filters=filters)
-
-    # compute the clones from the mapping
+    # a new clone is only needed once every previous clone has been closed
     scheduling_infos: list[WorkPackageSchedulingInfo] = []
-    mapping = defaultdict(list)
-    [mapping[r.to].append(r.from_)  for r in relations]
     for template in templates:
-        if not mapping[template.id]:
+        if not clone_index.open_clones_of(template.id):
             interval = template['Interval/Day Of Month']
             dueDate = date.today() + timedelta(days=interval)
             clone_info = WorkPackageCloneInfo(
@@ -362,7 +1210,7 @@ async def calculate_fixed_delay_scheduling_infos(templates: list[WorkPackage]) -
     return scheduling_infos
 
 
-async def calculate_fixed_interval_scheduling_infos(templates: list[WorkPackage]) -> list[WorkPackageSchedulingInfo]:
+async def calculate_fixed_interval_scheduling_infos(templates: list[WorkPackage], clone_index: CloneIndex) -> list[WorkPackageSchedulingInfo]:
     templates = {t.id: t for t in templates if t['Auto Scheduling Algorithm']['title'] == 'Fixed Interval'}
 
     # short circuit evaluation
@@ -374,65 +1222,35 @@ async def calculate_fixed_interval_scheduling_infos(templates: list[WorkPackage]
     dates = {}
     for t in templates.values():
         try:
-            start = t['startDate'] or t['date_']
-            today = date.today()
-            delta: timedelta = today - start
-            interval = t['Interval/Day Of Month']
-            remainder = timedelta(days = interval - (delta.days % interval))
-            next_date = start + delta + remainder
-            dates[t.id] = next_date
+            dates[t.id] = next_fixed_interval_date(t, date.today())
         except (TypeError, ValueError) as e:
             logging.warning('Invalid recurring config for work package %d with error %s', t.id, e)
 
-    if not dates:
-        duplicates = []
-    else:
-        # queries for duplicated so we can get the info on them
-        filters = [{'duplicates': {'operator': '=', 'values': list(templates.keys())}}]
-        duplicates = await WorkPackage.query_work_packages(filters=filters)
-        duplicates = {d.id: d for d in duplicates if (d.startDate or d.dueDate or d.date_) in dates.values()}
-
-
-    # query the relations so we can link duplicated to templates with short circuiting
-    if not duplicates:
-        relations = []
-    else:
-        filters = [
-            {'to': {'operator': '=', 'values': list(templates.keys())}},
-            {'from': {'operator': '=', 'values': list(duplicates.keys())}},
-            {'type': {'operator': '=', 'values': ['duplicates']}}
-        ]
-        relations = await WorkPackageRelation.query_work_package_relations(filters=filters)
-
-    # compute the clones from the mapping
+    # compute the clones from the index
     scheduling_infos: list[WorkPackageSchedulingInfo] = []
-    mapping = defaultdict(list)
-    for r in relations:
-        d = duplicates[r.from_]
-        if (d.startDate or d.dueDate or d.date_) == dates[r.to]:
-            mapping[r.to].append(r.from_)
     for template in templates.values():
-        if not mapping[template.id]:
-            try:
-                dueDate = dates[template.id]
-                clone_info = WorkPackageCloneInfo(
-                    template=template,
-                    modifications = {
-                        'date': dueDate,
-                        'startDate': dueDate,
-                        'dueDate': dueDate
-                    }
-                )
-                scheduling_info = WorkPackageSchedulingInfo(clone_info = clone_info)
-                scheduling_infos.append(scheduling_info)
-            except Exception as e:
-                logging.warning('Failed to create clone info for work package %d with error %s', template.id, e)
+        try:
+            dueDate = dates[template.id]
+            if clone_index.has_clone_on(template.id, dueDate):
+                continue
+            clone_info = WorkPackageCloneInfo(
+                template=template,
+                modifications = {
+                    'date': dueDate,
+                    'startDate': dueDate,
+                    'dueDate': dueDate
+                }
+            )
+            scheduling_info = WorkPackageSchedulingInfo(clone_info = clone_info)
+            scheduling_infos.append(scheduling_info)
+        except Exception as e:
+            logging.warning('Failed to create clone info for work package %d with error %s', template.id, e)
 
     logging.debug('%d fixed interval scheduling_infos calculated', len(scheduling_infos))
     return scheduling_infos
 
 
-async def calculate_fixed_day_of_month_clone_infos(templates: list[WorkPackage]) -> list[WorkPackageSchedulingInfo]:
+async def calculate_fixed_day_of_month_clone_infos(templates: list[WorkPackage], clone_index: CloneIndex) -> list[WorkPackageSchedulingInfo]:
     templates = {t.id: t for t in templates if t['Auto Scheduling Algorithm']['title'] == 'Fixed Day Of Month'}
 
     # short circuit evaluation
@@ -444,65 +1262,35 @@ async def calculate_fixed_day_of_month_clone_infos(templates: list[WorkPackage])
     dates = {}
     for t in templates.values():
         try:
-            today = date.today()
-            day = t['Interval/Day Of Month']
-            # if day is in the past look to next months
-            next_date = today.replace(day=day)
-            if next_date <= today:
-                next_date = next_date + relativedelta(months=1)
-            dates[t.id] = next_date
+            dates[t.id] = next_fixed_day_of_month_date(t, date.today())
         except (TypeError, ValueError) as e:
             logging.warning('Invalid recurring config for work package %d with error %s', t.id, e)
 
-    if not dates:
-        duplicates = []
-    else:
-        # queries for duplicated so we can get the info on them
-        filters = [{'duplicates': {'operator': '=', 'values': list(templates.keys())}}]
-        duplicates = await WorkPackage.query_work_packages(filters=filters)
-        duplicates = {d.id: d for d in duplicates if (d.startDate or d.dueDate or d.date_) in dates.values()}
-
-
-    # query the relations so we can link duplicated to templates with short circuiting
-    if not duplicates:
-        relations = []
-    else:
-        filters = [
-            {'to': {'operator': '=', 'values': list(templates.keys())}},
-            {'from': {'operator': '=', 'values': list(duplicates.keys())}},
-            {'type': {'operator': '=', 'values': ['duplicates']}}
-        ]
-        relations = await WorkPackageRelation.query_work_package_relations(filters=filters)
-
-    # compute the clones from the mapping
+    # compute the clones from the index
     scheduling_infos: list[WorkPackageSchedulingInfo] = []
-    mapping = defaultdict(list)
-    for r in relations:
-        d = duplicates[r.from_]
-        if (d.startDate or d.dueDate or d.date_) == dates[r.to]:
-            mapping[r.to].append(r.from_)
     for template in templates.values():
-        if not mapping[template.id]:
-            try:
-                dueDate = dates[template.id]
-                clone_info = WorkPackageCloneInfo(
-                    template=template,
-                    modifications = {
-                        'date': dueDate,
-                        'startDate': dueDate,
-                        'dueDate': dueDate
-                    }
-                )
-                scheduling_info = WorkPackageSchedulingInfo(clone_info=clone_info)
-                scheduling_infos.append(scheduling_info)
-            except KeyError as e:
-                logging.warning('Failed to create clone info for work package %d with error %s', template.id, e)
+        try:
+            dueDate = dates[template.id]
+            if clone_index.has_clone_on(template.id, dueDate):
+                continue
+            clone_info = WorkPackageCloneInfo(
+                template=template,
+                modifications = {
+                    'date': dueDate,
+                    'startDate': dueDate,
+                    'dueDate': dueDate
+                }
+            )
+            scheduling_info = WorkPackageSchedulingInfo(clone_info=clone_info)
+            scheduling_infos.append(scheduling_info)
+        except KeyError as e:
+            logging.warning('Failed to create clone info for work package %d with error %s', template.id, e)
 
     logging.debug('%d fixed day of month scheduling_infos calculated', len(scheduling_infos))
     return scheduling_infos
 
 
-async def calculate_fixed_day_of_year_clone_infos(templates: list[WorkPackage]) -> list[WorkPackageSchedulingInfo]:
+async def calculate_fixed_day_of_year_clone_infos(templates: list[WorkPackage], clone_index: CloneIndex) -> list[WorkPackageSchedulingInfo]:
     templates = {t.id: t for t in templates if t['Auto Scheduling Algorithm']['title'] == 'Fixed Day Of Year'}
 
     # short circuit evaluation
@@ -514,63 +1302,36 @@ async def calculate_fixed_day_of_year_clone_infos(templates: list[WorkPackage])
     dates = {}
     for t in templates.values():
         try:
-            today = date.today()
-            next_date = t.startDate or t.dueDate or t.date_
-            next_date = next_date.replace(year=today.year)
-            dates[t.id] = next_date
+            dates[t.id] = next_fixed_day_of_year_date(t, date.today())
         except (TypeError, ValueError) as e:
             logging.warning('Invalid recurring config for work package %d with error %s', t.id, e)
 
-    if not dates:
-        duplicates = []
-    else:
-        # queries for duplicated so we can get the info on them
-        filters = [{'duplicates': {'operator': '=', 'values': list(templates.keys())}}]
-        duplicates = await WorkPackage.query_work_packages(filters=filters)
-        duplicates = {d.id: d for d in duplicates if (d.startDate or d.dueDate or d.date_) in dates.values()}
-
-
-    # query the relations so we can link duplicated to templates with short circuiting
-    if not duplicates:
-        relations = []
-    else:
-        filters = [
-            {'to': {'operator': '=', 'values': list(templates.keys())}},
-            {'from': {'operator': '=', 'values': list(duplicates.keys())}},
-            {'type': {'operator': '=', 'values': ['duplicates']}}
-        ]
-        relations = await WorkPackageRelation.query_work_package_relations(filters=filters)
-
-    # compute the clones from the mapping
+    # compute the clones from the index
     scheduling_infos: list[WorkPackageSchedulingInfo] = []
-    mapping = defaultdict(list)
-    for r in relations:
-        d = duplicates[r.from_]
-        if (d.startDate or d.dueDate or d.date_) == dates[r.to]:
-            mapping[r.to].append(r.from_)
     for template in templates.values():
-        if not mapping[template.id]:
-            try:
-                dueDate = dates[template.id]
-                clone_info = WorkPackageCloneInfo(
-                    template=template,
-                    modifications = {
-                        'date': dueDate,
-                        'startDate': dueDate,
-                        'dueDate': dueDate
-                    }
-                )
-                scheduling_info = WorkPackageSchedulingInfo(clone_info=clone_info)
-                scheduling_infos.append(scheduling_info)
-            except KeyError as e:
-                logging.warning('Failed to create clone info for work package %d with error %s', template.id, e)
+        try:
+            dueDate = dates[template.id]
+            if clone_index.has_clone_on(template.id, dueDate):
+                continue
+            clone_info = WorkPackageCloneInfo(
+                template=template,
+                modifications = {
+                    'date': dueDate,
+                    'startDate': dueDate,
+                    'dueDate': dueDate
+                }
+            )
+            scheduling_info = WorkPackageSchedulingInfo(clone_info=clone_info)
+            scheduling_infos.append(scheduling_info)
+        except KeyError as e:
+            logging.warning('Failed to create clone info for work package %d with error %s', template.id, e)
 
     logging.debug('%d fixed day of year scheduling_infos calculated', len(scheduling_infos))
     return scheduling_infos
 
 
 
-async def calculate_weather_dependent_clone_infos(templates: list[WorkPackage]) -> list[WorkPackageSchedulingInfo]:
+async def calculate_weather_dependent_clone_infos(templates: list[WorkPackage], clone_index: CloneIndex, config: com.APIConfig=com.APIConfig.from_env()) -> list[WorkPackageSchedulingInfo]:
     templates = [t for t in templates if t['Auto Scheduling Algorithm']['title'] == 'Weather Forecast']
 
     # short circuit evaluation
@@ -578,51 +1339,38 @@ async def calculate_weather_dependent_clone_infos(templates: list[WorkPackage])
     if not templates:
         return []
 
-    # get the number of days to query weather for
-    num_days = max((t['Interval/Day Of Month'] for t in templates))
-    weather_data = await com.query_forecast(num_days)
-    if weather_data is None:
-        logging.warning('Weather forecast unavailable, skipping weather dependent scheduling')
-        return []
-    weather_data = weather_data['minutely_15']
-    
-    def are_conditions_met(weather_data: dict, template: WorkPackage):
-        # get the config from the work package
-        config = template['Weather Conditions']
-        config = json.loads(config)
-        num_days = template['Interval/Day Of Month']
-        idx = max(0, (num_days * 24 * 4) - 1)  # convert days to quarter hours then zero idx based
-        
-        # check for max conditions
-        for param, forecast_values in weather_data.items():
-            max_allowed_value = config.get(param)
-            if (max_allowed_value is not None) and (max(forecast_values[:idx]) > max_allowed_value):
-                return True
-        return False
-
-    # query existing duplicates dated today so we don't create dupes if the
+    # group the templates by the grid cell of their location so each cell is fetched once
+    groups: dict[tuple, list[WorkPackage]] = defaultdict(list)
+    for t in templates:
+        latitude, longitude = weather_location(t) or (config.latitude, config.longitude)
+        cell = (None, None) if (latitude is None) or (longitude is None) else com.forecast_cell(latitude, longitude, config)
+        groups[cell].append(t)
+
+    # get the forecast for each cell, far enough out for the longest horizon in it
+    async def query_cell_forecast(cell: tuple) -> Optional[dict]:
+        return await com.query_forecast(max(t['Interval/Day Of Month'] for t in groups[cell]), config, *cell)
+
+    # a cell whose forecast fails only skips its own templates
+    cells = list(groups.keys())
+    forecasts = await asyncio.gather(*[query_cell_forecast(cell) for cell in cells], return_exceptions=True)
+    detected: dict[int, bool] = {}
+    for cell, weather_data in zip(cells, forecasts):
+        # only errors skip a cell, cancellation and the like still propagate
+        if isinstance(weather_data, BaseException) and not isinstance(weather_data, Exception):
+            raise weather_data
+        if isinstance(weather_data, Exception):
+            logging.warning('Weather forecast failed for %s with error %r, skipping %d templates', cell, weather_data, len(groups[cell]))
+            continue
+        if weather_data is None:
+            logging.warning('Weather forecast unavailable for %s, skipping %d templates', cell, len(groups[cell]))
+            continue
+        results = evaluate_weather_conditions(groups[cell], forecast_prefix_maxima(weather_data['minutely_15']))
+        detected.update(zip([t.id for t in groups[cell]], results.tolist()))
+    templates = [t for t in templates if t.id in detected]
+
+    # existing duplicates dated today are checked so we don't create dupes if the
     # template state flag failed to update on a prior run
     today = date.today()
-    template_ids = [t.id for t in templates]
-    filters = [{'duplicates': {'operator': '=', 'values': template_ids}}]
-    duplicates = await WorkPackage.query_work_packages(filters=filters)
-    duplicates = {d.id: d for d in duplicates if (d.startDate or d.dueDate or d.date_) == today}
-
-    if not duplicates:
-        relations = []
-    else:
-        filters = [
-            {'to': {'operator': '=', 'values': template_ids}},
-            {'from': {'operator': '=', 'values': list(duplicates.keys())}},
-            {'type': {'operator': '=', 'values': ['duplicates']}}
-        ]
-        relations = await WorkPackageRelation.query_work_package_relations(filters=filters)
-
-    existing_clones_for_today = defaultdict(list)
-    for r in relations:
-        d = duplicates[r.from_]
-        if (d.startDate or d.dueDate or d.date_) == today:
-            existing_clones_for_today[r.to].append(r.from_)
 
     # create new clones when codes in forecast goes from false to true
     scheduling_infos = []
@@ -630,8 +1378,8 @@ async def calculate_weather_dependent_clone_infos(templates: list[WorkPackage])
     for t in templates:
         scheduling_info = WorkPackageSchedulingInfo()
         previously_detected = t[fieldName]
-        currently_detected = are_conditions_met(weather_data, t)
-        if currently_detected and (not previously_detected) and (not existing_clones_for_today[t.id]):
+        currently_detected = detected[t.id]
+        if currently_detected and (not previously_detected) and (not clone_index.has_clone_on(t.id, today)):
             dueDate = today
             clone_info = WorkPackageCloneInfo(
                 template=t,
@@ -658,56 +1406,316 @@ async def calculate_weather_dependent_clone_infos(templates: list[WorkPackage])
     return scheduling_infos
 
 
+# the calculator for each auto scheduling algorithm
+CALCULATORS = {
+    'Fixed Delay':          calculate_fixed_delay_scheduling_infos,
+    'Fixed Interval':       calculate_fixed_interval_scheduling_infos,
+    'Fixed Day Of Month':   calculate_fixed_day_of_month_clone_infos,
+    'Fixed Day Of Year':    calculate_fixed_day_of_year_clone_infos,
+    'Weather Forecast':     calculate_weather_dependent_clone_infos,
+}
+
+
+async def handle_closed_clone(work_package_id: int, config: com.APIConfig=com.APIConfig.from_env(), lock: Optional[asyncio.Lock]=None):
+    """Schedules the next clone of the Fixed Delay template that the closed work
+    package duplicates. Nothing is created if the work package isn't a clone, its
+    template isn't Fixed Delay or the template still has another open clone. Pass
+    the lock held by Fixed Delay polling passes so the two can't both see no open
+    clone and create one each.
+    """
+    filters = [
+        {'from': {'operator': '=', 'values': [work_package_id]}},
+        {'type': {'operator': '=', 'values': ['duplicates']}}
+    ]
+    relations = await RelationSummary.query_relations(filters=filters)
+    if not relations:
+        return
+
+    # the schemas are needed to resolve the custom field names on the templates
+    await query_scheduling_schemas()
+    filters = [{'id': {'operator': '=', 'values': [r.to for r in relations]}}]
+    await schedule_fixed_delay_templates(filters, config, lock)
+
+
+async def handle_created_template(work_package_id: int, config: com.APIConfig=com.APIConfig.from_env(), lock: Optional[asyncio.Lock]=None):
+    """Schedules the first clone of a new Fixed Delay template, rather than leaving it
+    to the next polling pass. Nothing is created if the work package isn't a template.
+    """
+    schemas = await query_scheduling_schemas()
+    filters = [{'id': {'operator': '=', 'values': [work_package_id]}}, *template_filters(schemas)]
+    await schedule_fixed_delay_templates(filters, config, lock)
+
+
+async def schedule_fixed_delay_templates(filters: list[dict], config: com.APIConfig=com.APIConfig.from_env(), lock: Optional[asyncio.Lock]=None):
+    """Creates a clone of every open Fixed Delay template matching the filters that
+    has no open clone, the way a polling pass would.
+    """
+    async with (lock or asyncio.Lock()):
+        filters = [{'status_id': {'operator': 'o', 'values': None}}, *filters]
+        templates = await WorkPackage.query_work_packages(filters=filters)
+        templates = [t for t in templates if scheduling_algorithm(t) == 'Fixed Delay']
+        if not templates:
+            return
+
+        logging.info('Checking fixed delay templates %s', [t.id for t in templates])
+        clone_index = await CloneIndex.build(templates, {}, config)
+        scheduling_infos = await calculate_fixed_delay_scheduling_infos(templates, clone_index)
+        projects = await ProjectIndex.build()
+        results = await asyncio.gather(*[si.clone_info.create_clone(projects, config) for si in scheduling_infos], return_exceptions=True)
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            raise failures[0]
+
+
+async def handle_webhook_event(action: str, work_package_id: int, config: com.APIConfig=com.APIConfig.from_env(), lock: Optional[asyncio.Lock]=None):
+    """Passes a work package event from the webhook receiver to its handler.
+    """
+    if action == 'work_package:created':
+        await handle_created_template(work_package_id, config, lock)
+    else:
+        await handle_closed_clone(work_package_id, config, lock)
+
+
+async def apply_scheduling_infos(queue: asyncio.Queue, projects: ProjectIndex, failures: list[Exception]):
+    """Worker that applies scheduling infos from the queue until it is cancelled.
+    Failures are collected rather than raised so one bad template doesn't stall the
+    rest of the pipeline.
+    """
+    while True:
+        scheduling_info: WorkPackageSchedulingInfo = await queue.get()
+        try:
+            await scheduling_info.apply(projects)
+        except Exception as e:
+            logging.exception('Failed to apply scheduling info %s', scheduling_info)
+            failures.append(e)
+        finally:
+            queue.task_done()
+
+
+async def run_once(algorithms: Optional[set[str]]=None, config: com.APIConfig=com.APIConfig.from_env()):
+    """Runs a single scheduling pass. Calculators and a pool of workers run as a
+    pipeline, clones are created and templates updated while the slower algorithms
+    are still being calculated.
+    """
+    queue = asyncio.Queue(maxsize=config.pipeline_queue_size)
+    failures: list[Exception] = []
+    projects = await ProjectIndex.build()
+    workers = [asyncio.create_task(apply_scheduling_infos(queue, projects, failures)) for _ in range(config.pipeline_workers)]
+    try:
+        with telemetry.timed('scheduling run', 'scheduler.run.duration'):
+            logging.info('Calculating scheduling infos...')
+            scheduling_infos = await calculate_scheduling_infos(config=config, algorithms=algorithms, queue=queue)
+            await queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    logging.info('Applied %d scheduling infos, %d failed', len(scheduling_infos) - len(failures), len(failures))
+    if failures:
+        raise failures[0]
+
+
+async def plan_once(algorithms: Optional[set[str]]=None, config: com.APIConfig=com.APIConfig.from_env()) -> dict:
+    """Calculates a scheduling pass without applying it. The client is made read only
+    for the duration, so no work package or relation can be created or updated.
+    Returns the clones and template updates that would be applied, along with the
+    read requests and bytes used by each phase and calculator.
+    """
+    client = com.get_client(config)
+    client.read_only = True
+    before = {phase: dict(stats) for phase, stats in client.phase_stats.items()}
+    try:
+        scheduling_infos = await calculate_scheduling_infos(config=config, algorithms=algorithms, dry_run=True)
+        with com.attribute_requests('projects'):
+            projects = await ProjectIndex.build()
+    finally:
+        client.read_only = False
+
+    plans = [si.plan(projects) for si in scheduling_infos]
+    reads = {
+        phase: {key: val - before.get(phase, {}).get(key, 0) for key, val in stats.items()}
+        for phase, stats in sorted(client.phase_stats.items())
+    }
+    return {
+        'planned': date.today().isoformat(),
+        'clones': [p['clone'] for p in plans if 'clone' in p],
+        'template_updates': [p['template_update'] for p in plans if 'template_update' in p],
+        'reads': reads,
+    }
+
+
+def setup_logging(config: com.APIConfig=com.APIConfig.from_env(), path: Path=Path('/app/logs/app.log'), stream: TextIO=sys.stdout) -> logging.handlers.QueueListener:
+    """Routes every log record through a queue to a listener thread that writes them
+    to the console and a size rotated log file, so the event loop never blocks on
+    disk writes. The returned listener must be stopped to flush the queue on exit.
+    """
+    # setup the handlers
+    console_handler = logging.StreamHandler(stream=stream)
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=config.log_max_bytes, backupCount=config.log_backups)
+    # format the logs, the otel collector parses this format
+    format = '%(asctime)s - %(levelname)s - %(message)s'
+    formatter = logging.Formatter(format)
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+    # set the log levels
+    console_handler.setLevel(config.log_level)
+    file_handler.setLevel(logging.DEBUG)
+    # get the root logger, setting it to level DEBUG so our handlers work
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def build_profile_report(phases: dict[str, dict], wall_s: float, config: com.APIConfig=com.APIConfig.from_env(), profiler: Optional[cProfile.Profile]=None, top: int=50) -> dict:
+    """Returns a json serializable report of a profiled run. The phases are the span
+    timings recorded by telemetry, and the profiler's top functions by cumulative time
+    are included when one was used.
+    """
+    client = com.get_client(config)
+    report = {
+        'started': datetime.now(timezone.utc).isoformat(),
+        'wall_s': round(wall_s, 6),
+        'phases': phases,
+        'http': {**client.stats, **client.governor.stats},
+        'caches': cache_stats(),
+    }
+    if profiler is not None:
+        stats = pstats.Stats(profiler).stats
+        functions = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+        report['functions'] = [
+            {'function': pstats.func_std_string(func), 'calls': calls, 'total_s': round(total, 6), 'cumulative_s': round(cumulative, 6)}
+            for func, (_, calls, total, cumulative, _) in functions
+        ]
+    return report
+
+
 async def async_main():
-    logging.info('Calculating scheduling infos...')
-    scheduling_infos = await calculate_scheduling_infos()
-
-    clone_infos = [si.clone_info for si in scheduling_infos if si.clone_info is not None]
-    logging.info('Creating %d new work packages', len(clone_infos))
-    await asyncio.gather(*[ci.create_clone() for ci in clone_infos])
-
-    template_infos = [si.template_info for si in scheduling_infos if si.template_info is not None]
-    logging.info('Update %d template work packages', len(template_infos))
-    await asyncio.gather(*[ti.update_template() for ti in template_infos])
-
-    # trims up the log files
-    path = Path('/app/logs/app.log').resolve()
-    lines = path.read_text().splitlines()
-    if len(lines) > 10_000:
-        lines = lines[::-1]
-        lines = lines[:10_000]
-        lines = lines[::-1]
-    lines = '\n'.join(lines)
-    if lines:
-        lines = f'{lines}\n'
-    path.write_text(lines)
+    try:
+        await run_once()
+    finally:
+        logging.debug('cache statistics %s', cache_stats())
+        await com.close_clients()
+
+
+async def async_plan(path: Optional[Path]=None, config: com.APIConfig=com.APIConfig.from_env()):
+    """Writes the plan of a scheduling pass to path as json, or to stdout without one.
+    """
+    try:
+        plan = json.dumps(await plan_once(config=config), indent=2, default=str)
+    finally:
+        await com.close_clients()
+    if path is None:
+        print(plan)
+    else:
+        path.write_text(plan)
+        logging.info('Plan written to %s', path)
+
+
+async def async_daemon(config: com.APIConfig=com.APIConfig.from_env()):
+    """Runs scheduling passes forever on an interval with random jitter. Unlike a cron
+    run, the event loop, http connection pool and caches stay alive between passes,
+    so each pass only pays for the api calls it actually needs. If a webhook port is
+    configured, closed clones schedule their Fixed Delay template and new Fixed Delay
+    templates get their first clone as the event arrives, and Fixed Delay is only polled every config.webhook_reconcile_interval seconds.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # held while Fixed Delay is scheduled, by webhook events and by the polling passes
+    fixed_delay_lock = asyncio.Lock()
+    receiver = None
+    if config.webhook_port is not None:
+        receiver = WebhookReceiver(functools.partial(handle_webhook_event, config=config, lock=fixed_delay_lock), config)
+        await receiver.start()
+
+    logging.info('Scheduler daemon started with an interval of %ss', config.daemon_interval)
+    last_reconciled = -math.inf
+    try:
+        while not stop.is_set():
+            algorithms = None
+            if (receiver is not None) and (time.monotonic() - last_reconciled < config.webhook_reconcile_interval):
+                algorithms = set(CALCULATORS) - {'Fixed Delay'}
+            else:
+                last_reconciled = time.monotonic()
+            try:
+                if (algorithms is None) or ('Fixed Delay' in algorithms):
+                    async with fixed_delay_lock:
+                        await run_once(algorithms, config)
+                else:
+                    await run_once(algorithms, config)
+                logging.debug('cache statistics %s', cache_stats())
+            except Exception:
+                logging.exception('Scheduling pass failed')
+            delay = max(0.0, config.daemon_interval + random.uniform(-config.daemon_jitter, config.daemon_jitter))
+            logging.debug('next scheduling pass in %.0fs', delay)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if receiver is not None:
+            await receiver.stop()
+        await com.close_clients()
+    logging.info('Scheduler daemon stopped')
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Creates work packages from recurring templates.')
+    parser.add_argument('--clear-cache', action='store_true', help='invalidate the persistent metadata cache before running')
+    parser.add_argument('--daemon', action='store_true', help='keep running and schedule on an interval instead of exiting after one pass')
+    parser.add_argument('--profile', nargs='?', const=Path('/app/logs/profile.json'), type=Path, metavar='PATH',
+                        help='time every phase of the run and write a json report to PATH')
+    parser.add_argument('--plan', nargs='?', const='-', metavar='PATH',
+                        help='calculate the clones and template updates without applying them and write them as json to PATH, or stdout')
+    parser.add_argument('--cprofile', action='store_true', help='also run cProfile and add the slowest functions to the profile report')
+    args = parser.parse_args()
+
+    listener = None
     try:
         # load in configs
         config = com.APIConfig.from_env()
-
-        # setup the handlers
-        console_handler = logging.StreamHandler(stream=sys.stdout)
-        file_handler = logging.FileHandler('/app/logs/app.log')
-        # format the logs
-        format = '%(asctime)s - %(levelname)s - %(message)s'
-        formatter = logging.Formatter(format)
-        console_handler.setFormatter(formatter)
-        file_handler.setFormatter(formatter)
-        # set the log levels
-        console_handler.setLevel(config.log_level)
-        file_handler.setLevel(logging.DEBUG)
-        # get the root logger, setting it to level DEBUG so our handlers work
-        logger = logging.getLogger()
-        logger.setLevel(logging.DEBUG)
-        # add the handlers
-        logger.addHandler(console_handler)
-        logger.addHandler(file_handler)
-
-        # run the app
-        asyncio.run(async_main())
+        # a plan may be written to stdout, so it must not be mixed with the console logs
+        listener = setup_logging(config, stream=sys.stderr if args.plan else sys.stdout)
+
+        # drop cached projects, types, schemas and due dates if asked to
+        cache = com.get_metadata_cache(config)
+        if args.clear_cache and (cache is not None):
+            cache.invalidate()
+        if args.clear_cache and config.due_index:
+            get_due_index(config).clear()
+
+        # run the app, flushing any telemetry on the way out
+        telemetry.setup(config)
+        profiler = cProfile.Profile() if (args.profile and args.cprofile) else None
+        if args.profile:
+            telemetry.start_profile()
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            if args.plan:
+                asyncio.run(async_plan(None if args.plan == '-' else Path(args.plan), config))
+            else:
+                asyncio.run(async_daemon(config) if args.daemon else async_main())
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if args.profile:
+                report = build_profile_report(telemetry.stop_profile(), time.perf_counter() - started, config, profiler)
+                args.profile.write_text(json.dumps(report, indent=2))
+                logging.info('Profile report written to %s', args.profile)
+            telemetry.shutdown()
     
     except Exception as e:
         logging.exception('Exited with an exception')
+    finally:
+        # drains the queued records before exiting
+        if listener is not None:
+            listener.stop()
@@ -0,0 +1,172 @@
+import re
+import time
+import logging
+import contextlib
+from pathlib import Path
+from urllib.parse import urlsplit
+from collections import defaultdict
+from typing import Any, Iterator, Optional
+
+# opentelemetry is optional, every function in this module is a no-op without it
+try:
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader, ConsoleMetricExporter
+    OPENTELEMETRY_AVAILABLE = True
+except ImportError:
+    OPENTELEMETRY_AVAILABLE = False
+
+
+# ————————————————————————— Module Scoped Variables —————————————————————————
+
+SERVICE_NAME = 'openproject-recurring-tasks'
+
+_tracer = None
+_meter = None
+_providers: list = []
+_instruments: dict[str, Any] = {}
+_file = None
+_profile: Optional[dict[str, list[float]]] = None  # span durations by name while profiling
+
+# name, kind, unit and description of every instrument, created on first use
+INSTRUMENTS = {
+    'http.client.request.duration': ('histogram', 's', 'Duration of api requests by endpoint'),
+    'openproject.pages': ('counter', '{page}', 'Collection pages fetched'),
+    'scheduler.cache.requests': ('counter', '{request}', 'Cache lookups by cache and result'),
+    'scheduler.clones.created': ('counter', '{work_package}', 'Clones created'),
+    'scheduler.algorithm.duration': ('histogram', 's', 'Time taken to calculate each algorithm'),
+    'scheduler.run.duration': ('histogram', 's', 'Time taken by a scheduling run'),
+}
+
+
+# ————————————————————————— Functions —————————————————————————
+
+def setup(config) -> bool:
+    """Starts exporting spans and metrics when config.telemetry is enabled. They are
+    sent over otlp/http when an endpoint is configured, otherwise they are appended
+    as json lines to config.telemetry_path. Returns whether telemetry is enabled.
+    """
+    global _tracer, _meter, _file
+    if (not config.telemetry) or (_tracer is not None):
+        return _tracer is not None
+    if not OPENTELEMETRY_AVAILABLE:
+        logging.warning('Telemetry is enabled but opentelemetry-sdk is not installed')
+        return False
+
+    endpoint = config.otel_exporter_otlp_endpoint
+    if endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        span_exporter = OTLPSpanExporter(endpoint=f'{endpoint.rstrip("/")}/v1/traces')
+        metric_exporter = OTLPMetricExporter(endpoint=f'{endpoint.rstrip("/")}/v1/metrics')
+    else:
+        path = Path(config.telemetry_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _file = path.open('a')
+        span_exporter = ConsoleSpanExporter(out=_file, formatter=lambda span: span.to_json(indent=None) + '\n')
+        metric_exporter = ConsoleMetricExporter(out=_file, formatter=lambda data: data.to_json(indent=None) + '\n')
+
+    resource = Resource.create({'service.name': SERVICE_NAME})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    reader = PeriodicExportingMetricReader(metric_exporter, export_interval_millis=config.telemetry_interval * 1000)
+    meter_provider = MeterProvider(resource=resource, metric_readers=[reader])
+    _providers.extend([tracer_provider, meter_provider])
+    _tracer = tracer_provider.get_tracer(SERVICE_NAME)
+    _meter = meter_provider.get_meter(SERVICE_NAME)
+    logging.info('Exporting telemetry to %s', endpoint or config.telemetry_path)
+    return True
+
+
+def shutdown():
+    """Flushes and stops the exporters.
+    """
+    global _tracer, _meter, _file
+    for provider in _providers:
+        provider.shutdown()
+    _providers.clear()
+    _instruments.clear()
+    _tracer = _meter = None
+    if _file is not None:
+        _file.close()
+        _file = None
+
+
+def endpoint_of(url: str) -> str:
+    """Returns the path of a url with its ids replaced, so requests for different
+    work packages are recorded under the same endpoint.
+    """
+    return re.sub(r'/\d+(-\d+)?(?=/|$)', '/{id}', urlsplit(url).path)
+
+
+def start_profile():
+    """Starts timing every span, independently of whether they are exported.
+    """
+    global _profile
+    _profile = defaultdict(list)
+
+
+def stop_profile() -> dict[str, dict]:
+    """Stops profiling and returns the count, total, mean and max seconds of every
+    span name, sorted by name so reports from different runs can be diffed.
+    """
+    global _profile
+    profile, _profile = _profile or {}, None
+    return {
+        name: {
+            'count': len(durations),
+            'total_s': round(sum(durations), 6),
+            'mean_s': round(sum(durations) / len(durations), 6),
+            'max_s': round(max(durations), 6),
+        }
+        for name, durations in sorted(profile.items())
+    }
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Any]]:
+    """Records the enclosed block as a span, yielding the span or None when disabled.
+    The block is also timed while a profile is running.
+    """
+    started = time.perf_counter()
+    try:
+        if _tracer is None:
+            yield None
+        else:
+            with _tracer.start_as_current_span(name, attributes=attributes) as current:
+                yield current
+    finally:
+        if _profile is not None:
+            _profile[name].append(time.perf_counter() - started)
+
+
+def _instrument(name: str):
+    if name not in _instruments:
+        kind, unit, description = INSTRUMENTS[name]
+        create = _meter.create_histogram if kind == 'histogram' else _meter.create_counter
+        _instruments[name] = create(name, unit=unit, description=description)
+    return _instruments[name]
+
+
+def count(name: str, value: int=1, **attributes):
+    if _meter is not None:
+        _instrument(name).add(value, attributes)
+
+
+def record(name: str, value: float, **attributes):
+    if _meter is not None:
+        _instrument(name).record(value, attributes)
+
+
+@contextlib.contextmanager
+def timed(name: str, histogram: str, **attributes) -> Iterator[Optional[Any]]:
+    """Records the enclosed block as a span and its duration in a histogram.
+    """
+    started = time.perf_counter()
+    try:
+        with span(name, **attributes) as current:
+            yield current
+    finally:
+        record(histogram, time.perf_counter() - started, **attributes)
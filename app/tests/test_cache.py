@@ -0,0 +1,110 @@
+import unittest
+from datetime import date
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from cache import MetadataCache, SyncSnapshot, DueIndex
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.cache = MetadataCache(Path(self.tmp.name) / 'cache' / 'metadata.sqlite3', ttl=60)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_values_persist_between_instances(self):
+        """Tests that a value written by one instance is read by the next one,
+        as happens between two cron runs.
+        """
+        self.cache.set('schema:1-1', {'_links': {'self': {'href': 'api/v3/schemas/1-1'}}})
+        self.cache.close()
+        cache = MetadataCache(self.cache.path, ttl=60)
+        self.assertEqual(cache.get('schema:1-1'), {'_links': {'self': {'href': 'api/v3/schemas/1-1'}}})
+        cache.close()
+
+    def test_expired_values_are_ignored(self):
+        self.cache.set('projects:', {'total': 0}, ttl=-1)
+        self.assertIsNone(self.cache.get('projects:'))
+
+    def test_invalidate_by_prefix(self):
+        self.cache.set('schema:1-1', {})
+        self.cache.set('schema:1-2', {})
+        self.cache.set('types:1', {})
+        self.assertEqual(self.cache.invalidate('schema:'), 2)
+        self.assertIsNone(self.cache.get('schema:1-1'))
+        self.assertEqual(self.cache.get('types:1'), {})
+        self.assertEqual(self.cache.invalidate(), 1)
+        self.assertIsNone(self.cache.get('types:1'))
+
+
+class TestSyncSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.snapshot = SyncSnapshot(Path(self.tmp.name) / 'snapshot.sqlite3')
+
+    def tearDown(self):
+        self.snapshot.close()
+        self.tmp.cleanup()
+
+    def test_deltas_are_merged_into_the_snapshot(self):
+        """Tests that a full sync can be followed by upserts and deletes that
+        only touch the changed templates and clones.
+        """
+        self.snapshot.replace([{'id': 1}, {'id': 2}], [(1, True, {'id': 10})])
+        self.snapshot.upsert_templates([{'id': 2, 'subject': 'changed'}])
+        self.snapshot.delete_templates([1])
+        self.snapshot.upsert_clones([(1, False, {'id': 10}), (2, True, {'id': 11})])
+        self.assertEqual(self.snapshot.load_templates(), [{'id': 2, 'subject': 'changed'}])
+        self.assertEqual(self.snapshot.load_clones(), [(1, False, {'id': 10}), (2, True, {'id': 11})])
+        self.assertEqual(self.snapshot.clone_templates(), {10: 1, 11: 2})
+
+    def test_failed_replace_keeps_the_previous_snapshot(self):
+        """Tests that a full sync is written in one transaction together with its
+        state, so a failure part way through leaves the previous snapshot intact.
+        """
+        self.snapshot.replace([{'id': 1}], [(1, True, {'id': 10})], {'full_sync': 'first'})
+        with self.assertRaises(KeyError):
+            self.snapshot.replace([{'id': 2}], [(2, True, {})], {'full_sync': 'second'})
+        self.assertEqual(self.snapshot.load_templates(), [{'id': 1}])
+        self.assertEqual(self.snapshot.load_clones(), [(1, True, {'id': 10})])
+        self.assertEqual(self.snapshot.get_state('full_sync'), 'first')
+
+    def test_state_is_kept(self):
+        self.assertIsNone(self.snapshot.get_state('watermark'))
+        self.snapshot.set_state('watermark', '2026-01-01T00:00:00+00:00')
+        self.assertEqual(self.snapshot.get_state('watermark'), '2026-01-01T00:00:00+00:00')
+
+
+class TestDueIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.index = DueIndex(Path(self.tmp.name) / 'due.sqlite3')
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_only_future_entries_are_not_due(self):
+        self.index.schedule([(1, date(2026, 1, 1), 3), (2, date(2026, 1, 2), None), (3, date(2026, 2, 1), 5)])
+        self.assertEqual(self.index.not_due(date(2026, 1, 1)), {2: None, 3: 5})
+        self.index.schedule([(3, date(2026, 1, 1), 6)])
+        self.assertEqual(self.index.not_due(date(2026, 1, 1)), {2: None})
+        self.index.clear()
+        self.assertEqual(self.index.not_due(date(2026, 1, 1)), {})
+
+    def test_entries_are_removed_and_state_kept(self):
+        self.index.schedule([(1, date(2026, 2, 1), None), (2, date(2026, 2, 1), None)])
+        self.index.remove([1])
+        self.assertEqual(self.index.not_due(date(2026, 1, 1)), {2: None})
+        self.assertIsNone(self.index.get_state('checked'))
+        self.index.set_state('checked', '2026-01-01T00:00:00+00:00')
+        self.assertEqual(self.index.get_state('checked'), '2026-01-01T00:00:00+00:00')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, failfast=False)
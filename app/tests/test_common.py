@@ -1,5 +1,11 @@
 import os
+import asyncio
 import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 import common as com
 
 
@@ -24,6 +30,166 @@ class TestCommon(unittest.TestCase):
         url = com.build_url(config, 'api/v3/workpackages')
         self.assertEqual(url, 'http://foo.local/api/v3/workpackages')
 
+    def test_select_keeps_pagination_totals(self):
+        select = com.build_select(['id', 'startDate'])
+        self.assertEqual(select, 'total,count,elements/id,elements/startDate')
+
+    def test_page_concurrency_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            com.APIConfig(api_key='1234', host='foo.local', page_concurrency=0)
+
+    def test_limits_must_be_positive(self):
+        for field, value in (('rate_limit', 0), ('min_rate_limit', 0), ('max_rate_limit', -1), ('max_in_flight', 0),
+                             ('pipeline_workers', 0), ('pipeline_queue_size', -1)):
+            with self.subTest(field=field), self.assertRaises(ValueError):
+                com.APIConfig(api_key='1234', host='foo.local', **{field: value})
+
+
+class TestAPIClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        async def projects(request: web.Request):
+            return web.json_response({'total': 0, 'count': 0, '_embedded': {'elements': []}})
+        async def work_packages(request: web.Request):
+            offset = int(request.query['offset'])
+            page_size = int(request.query['pageSize'])
+            ids = list(range(1, 8))[(offset - 1) * page_size: offset * page_size]
+            elements = [{'id': i} for i in ids]
+            return web.json_response({'total': 7, 'count': len(elements), '_embedded': {'elements': elements}})
+        self.throttled = 2
+        async def statuses(request: web.Request):
+            if self.throttled > 0:
+                self.throttled -= 1
+                return web.json_response({}, status=429, headers={'Retry-After': '0'})
+            return web.json_response({'total': 0, 'count': 0, '_embedded': {'elements': []}})
+        self.forecasts = []
+        async def forecast(request: web.Request):
+            self.forecasts.append(dict(request.query))
+            return web.json_response({'minutely_15': {'precipitation': [0.0]}})
+        app = web.Application()
+        app.router.add_get('/v1/forecast', forecast)
+        app.router.add_get('/api/v3/projects', projects)
+        app.router.add_route('*', '/api/v3/statuses', statuses)
+        app.router.add_get('/api/v3/work_packages', work_packages)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.config = com.APIConfig(**{
+            'api_key':      '1234',
+            'host':         self.server.host,
+            'port':         self.server.port,
+            'https':        False,
+            'metadata_cache_path': '',
+        })
+
+    async def asyncTearDown(self):
+        await com.close_clients()
+        await self.server.close()
+
+    async def test_connections_are_reused_between_calls(self):
+        """Tests that consecutive calls share one pooled connection rather
+        than opening a new one per request.
+        """
+        for _ in range(3):
+            await com.query_projects(config=self.config)
+        stats = com.get_client(self.config).stats
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['connections_created'], 1)
+        self.assertEqual(stats['connections_reused'], 2)
+
+    async def test_pages_are_merged_in_order(self):
+        """Tests that concurrently fetched pages are merged back in page order.
+        """
+        data = await com.query_work_packages(page_size=2, config=self.config)
+        self.assertEqual([e['id'] for e in data['_embedded']['elements']], list(range(1, 8)))
+        self.assertEqual(data['count'], 7)
+
+    async def test_pages_are_streamed_in_order(self):
+        """Tests that the streaming variant yields each page in order.
+        """
+        pages = [data async for data in com.iter_work_packages(page_size=3, config=self.config)]
+        self.assertEqual([len(p['_embedded']['elements']) for p in pages], [3, 3, 1])
+        ids = [e['id'] for p in pages for e in p['_embedded']['elements']]
+        self.assertEqual(ids, list(range(1, 8)))
+
+    async def test_prefetch_is_cancelled_when_streaming_stops_early(self):
+        """Tests that the prefetched page is cancelled and awaited when the consumer
+        closes the stream before reaching the last page.
+        """
+        cancelled = []
+        async def fetch_page(endpoint, page, *args):
+            if page == 1:
+                return {'total': 7, 'count': 3, '_embedded': {'elements': [{'id': 1}, {'id': 2}, {'id': 3}]}}
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(page)
+                raise
+        with patch('common.fetch_page', fetch_page):
+            pages = com.iter_work_packages(page_size=3, config=self.config)
+            await anext(pages)
+            await asyncio.sleep(0)  # let the prefetch start
+            await pages.aclose()
+        self.assertEqual(cancelled, [2])
+
+    async def test_throttled_gets_are_retried(self):
+        """Tests that a throttled GET is retried after Retry-After and that the
+        governor backs off its rate.
+        """
+        client = com.get_client(self.config)
+        url = com.build_url('api/v3/statuses', self.config)
+        status, _ = await client.request('GET', url, headers=com.build_headers(self.config))
+        self.assertEqual(status, 200)
+        self.assertEqual(client.governor.stats['retries'], 2)
+        self.assertLess(client.governor.rate, self.config.rate_limit)
+
+    async def test_limits_grow_once_per_second(self):
+        """Tests that a burst of healthy responses only grows the rate and the
+        concurrency by one, rather than by one per response.
+        """
+        config = com.APIConfig(api_key='1234', host='foo.local', rate_limit=5, max_in_flight=8)
+        governor = com.RateGovernor(config)
+        governor.concurrency = 2.0
+        with patch('common.time.monotonic', return_value=governor._increased + 1.0):
+            for _ in range(50):
+                await governor.release(True)
+        self.assertEqual(governor.rate, 6.0)
+        self.assertEqual(governor.concurrency, 3.0)
+
+    async def test_throttled_writes_are_not_retried(self):
+        """Tests that requests which aren't idempotent are returned as is.
+        """
+        client = com.get_client(self.config)
+        url = com.build_url('api/v3/statuses', self.config)
+        status, _ = await client.request('POST', url, headers=com.build_headers(self.config))
+        self.assertEqual(status, 429)
+        self.assertEqual(client.governor.stats['retries'], 0)
+
+    async def test_forecasts_are_cached_per_cell_and_horizon(self):
+        """Tests that nearby locations share a cached forecast from the weather
+        stand-in while a different horizon is fetched again.
+        """
+        with TemporaryDirectory() as tmp:
+            config = self.config.model_copy(update={
+                'weather_url': f'http://{self.server.host}:{self.server.port}/v1/forecast',
+                'metadata_cache_path': str(Path(tmp) / 'metadata.sqlite3'),
+            })
+            await com.query_forecast(2, config, 43.61, -116.21)
+            await com.query_forecast(2, config, 43.62, -116.18)
+            await com.query_forecast(3, config, 43.61, -116.21)
+            com.get_metadata_cache(config).close()
+        self.assertEqual(len(self.forecasts), 2)
+        self.assertEqual((self.forecasts[0]['latitude'], self.forecasts[0]['longitude']), ('43.6', '-116.2'))
+
+    async def test_forecasts_are_cached_in_memory_without_the_metadata_cache(self):
+        config = self.config.model_copy(update={
+            'weather_url': f'http://{self.server.host}:{self.server.port}/v1/forecast',
+            'metadata_cache_path': '',
+        })
+        await com.query_forecast(2, config, 43.61, -116.21)
+        await com.query_forecast(2, config, 43.61, -116.21)
+        com.get_forecast_cache(config).close()
+        self.assertEqual(len(self.forecasts), 1)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2, failfast=False)
\ No newline at end of file
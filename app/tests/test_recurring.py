@@ -1,7 +1,50 @@
+import os
+import json
+import signal
 import asyncio
+import logging
+import functools
 import unittest
-from unittest.mock import AsyncMock, patch
-from recurring import WorkPackageSchema, WorkPackage
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import common as com
+import telemetry
+from cache import DueIndex
+from recurring import (
+    WorkPackageSchema, WorkPackage, WorkPackageSummary, CloneIndex, Project, ProjectIndex,
+    cache_async, calculate_due_date, run_once, evaluate_weather_conditions, forecast_prefix_maxima,
+    setup_logging, build_profile_report, plan_once, sync_incremental, handle_closed_clone,
+    WorkPackageCloneInfo, WorkPackageTemplateInfo, WorkPackageSchedulingInfo,
+    calculate_weather_dependent_clone_infos, async_daemon, CALCULATORS, get_sync_snapshot, handle_webhook_event, calculate_scheduling_infos,
+    query_changed_due_templates, skip_templates_not_due
+)
+
+
+def page_of(*elements) -> dict:
+    return {'total': len(elements), 'count': len(elements), '_embedded': {'elements': list(elements)}}
+
+
+def work_package_data(id: int, status_id: int=1, on: str | None=None) -> dict:
+    return {
+        'id': id,
+        '_type': 'WorkPackage',
+        'subject': f'Mocked Task {id}',
+        'startDate': on,
+        '_links': {'status': {'href': f'/api/v3/statuses/{status_id}'}},
+    }
+
+
+def relation_data(from_: int, to: int) -> dict:
+    return {
+        '_links': {
+            'from': {'href': f'/api/v3/work_packages/{from_}'},
+            'to': {'href': f'/api/v3/work_packages/{to}'},
+        }
+    }
 
 
 class TestCommon(unittest.TestCase):
@@ -76,5 +119,758 @@ class TestCommon(unittest.TestCase):
                 self.assertEqual(wp['customField1'], 'foo')
                 self.assertEqual(wp['customField2'], 'bar')
 
+    def test_payload_skips_read_only_fields(self):
+        """Tests that attributes and links the schema marks as read only are left
+        out of the payload.
+        """
+        schema = WorkPackageSchema(**{
+            'id': {'writable': False},
+            'subject': {'writable': True},
+            'author': {'writable': False},
+            '_links': {'self': {'href': 'api/v3/schemas/1-1'}}
+        })
+        work_package = WorkPackage(**{
+            **work_package_data(1),
+            '_links': {'author': {'href': '/api/v3/users/1'}, 'type': {'href': '/api/v3/types/1'}}
+        })
+        payload = work_package.build_work_package_payload(schema)
+        self.assertEqual(schema.read_only_fields, {'id', 'author'})
+        self.assertNotIn('id', payload)
+        self.assertEqual(payload['subject'], 'Mocked Task 1')
+        self.assertEqual(list(payload['_links']), ['type'])
+
+
+class TestCloneIndex(unittest.IsolatedAsyncioTestCase):
+
+    async def test_clones_are_mapped_to_their_templates(self):
+        """Tests that the index links each clone back to its template, knows which
+        of them are open and lets the server filter dated clones by window.
+        """
+        queried_filters = []
+        async def iter_work_packages(*args, filters=None, **kwargs):
+            queried_filters.append(filters)
+            if 'status_id' in filters[1]:
+                yield page_of(work_package_data(10, 1, '2025-01-01'))
+            else:
+                yield page_of(work_package_data(11, 2, '2026-02-01'))
+        async def iter_work_package_relations(*args, **kwargs):
+            yield page_of(relation_data(10, 1), relation_data(11, 2))
+        templates = [WorkPackage(**work_package_data(i)) for i in (1, 2, 3)]
+        occurrences = {2: date(2026, 2, 1), 3: date(2026, 3, 1)}
+        with patch('recurring.com.iter_work_packages', iter_work_packages), \
+             patch('recurring.com.iter_work_package_relations', iter_work_package_relations):
+            index = await CloneIndex.build(templates, occurrences)
+        self.assertEqual(queried_filters[1], [
+            {'duplicates': {'operator': '=', 'values': [2]}},
+            {'startDate': {'operator': '=d', 'values': ['2026-02-01']}},
+        ])
+        self.assertEqual([c.id for c in index.open_clones_of(1)], [10])
+        self.assertEqual(index.open_clones_of(2), [])
+        self.assertTrue(index.has_clone_on(2, date(2026, 2, 1)))
+        self.assertFalse(index.has_clone_on(3, date(2026, 3, 1)))
+
+    async def test_spread_out_occurrences_are_queried_separately(self):
+        """Tests that dated clones are only queried on or right around each
+        occurrence, so the history between distant occurrences is never fetched.
+        """
+        queried_filters = []
+        async def iter_work_packages(*args, filters=None, **kwargs):
+            queried_filters.append(filters)
+            yield page_of()
+        templates = [WorkPackage(**work_package_data(i)) for i in (1, 2, 3, 4)]
+        occurrences = {1: date(2026, 2, 1), 2: date(2026, 2, 4), 3: date(2026, 6, 1), 4: date(2026, 12, 25)}
+        with patch('recurring.com.iter_work_packages', iter_work_packages):
+            await CloneIndex.build(templates, occurrences)
+        self.assertEqual(queried_filters, [
+            [{'duplicates': {'operator': '=', 'values': [1, 2]}}, {'startDate': {'operator': '<>d', 'values': ['2026-02-01', '2026-02-04']}}],
+            [{'duplicates': {'operator': '=', 'values': [3]}}, {'startDate': {'operator': '=d', 'values': ['2026-06-01']}}],
+            [{'duplicates': {'operator': '=', 'values': [4]}}, {'startDate': {'operator': '=d', 'values': ['2026-12-25']}}],
+        ])
+
+    def test_clones_round_trip_through_snapshots(self):
+        """Tests that the parsed clone records survive being stored in a snapshot.
+        """
+        clone = WorkPackageSummary.from_json(work_package_data(10, 3, '2026-02-01'))
+        self.assertEqual((clone.status_id, clone.scheduled_date), (3, date(2026, 2, 1)))
+        index = CloneIndex.from_snapshot([(1, True, clone.to_json())])
+        restored = index.open_clones_of(1)[0]
+        self.assertEqual((restored.id, restored.status_id), (10, 3))
+        self.assertTrue(index.has_clone_on(1, date(2026, 2, 1)))
+
+    async def test_provenance_fields_skip_the_relations_query(self):
+        """Tests that clones stamped with the provenance fields are keyed by them
+        and that no relations are queried.
+        """
+        queried_filters = []
+        async def iter_work_packages(*args, filters=None, **kwargs):
+            queried_filters.append(filters)
+            if 'customField1' in filters[0]:
+                yield page_of({**work_package_data(11, 2, '2026-02-03'), 'customField1': 2, 'customField2': '2026-02-01'})
+            else:
+                yield page_of()
+        relations = MagicMock()
+        config = com.APIConfig.from_env().model_copy(update={'provenance_fields': True})
+        fields = {'Source Template': 'customField1', 'Scheduled Occurrence': 'customField2'}
+        templates = [WorkPackage(**work_package_data(i)) for i in (2, 3)]
+        occurrences = {2: date(2026, 2, 1), 3: date(2026, 3, 1)}
+        with patch.dict(WorkPackageSchema.custom_field_name_map, fields), \
+             patch('recurring.com.iter_work_packages', iter_work_packages), \
+             patch('recurring.com.iter_work_package_relations', relations):
+            index = await CloneIndex.build(templates, occurrences, config)
+        relations.assert_not_called()
+        self.assertEqual(queried_filters[0], [
+            {'customField1': {'operator': '=', 'values': ['2']}},
+            {'customField2': {'operator': '=d', 'values': ['2026-02-01']}},
+        ])
+        self.assertTrue(index.has_clone_on(2, date(2026, 2, 1)))
+        self.assertFalse(index.has_clone_on(3, date(2026, 3, 1)))
+
+    async def test_unstamped_clones_are_found_through_relations(self):
+        """Tests that clones without the provenance fields, created before they
+        existed or in a schema without them, are still found next to stamped ones.
+        """
+        queried_filters, relation_filters = [], []
+        async def iter_work_packages(*args, filters=None, **kwargs):
+            queried_filters.append(filters)
+            if filters[0] == {'customField1': {'operator': '=', 'values': ['2']}}:
+                yield page_of({**work_package_data(11, 2, '2026-02-03'), 'customField1': 2, 'customField2': '2026-02-01'})
+            elif filters[0] == {'duplicates': {'operator': '=', 'values': [3]}}:
+                yield page_of(work_package_data(12, 2, '2026-03-01'))
+            else:
+                yield page_of()
+        async def iter_work_package_relations(*args, filters=None, **kwargs):
+            relation_filters.append(filters)
+            yield page_of(relation_data(12, 3))
+        config = com.APIConfig.from_env().model_copy(update={'provenance_fields': True})
+        fields = {'Source Template': 'customField1', 'Scheduled Occurrence': 'customField2'}
+        templates = [WorkPackage(**work_package_data(i)) for i in (2, 3)]
+        occurrences = {2: date(2026, 2, 1), 3: date(2026, 3, 1)}
+        with patch.dict(WorkPackageSchema.custom_field_name_map, fields), \
+             patch('recurring.com.iter_work_packages', iter_work_packages), \
+             patch('recurring.com.iter_work_package_relations', iter_work_package_relations):
+            index = await CloneIndex.build(templates, occurrences, config)
+        self.assertIn([
+            {'duplicates': {'operator': '=', 'values': [3]}},
+            {'startDate': {'operator': '=d', 'values': ['2026-03-01']}},
+            {'customField1': {'operator': '!*', 'values': None}},
+        ], queried_filters)
+        self.assertEqual(relation_filters[0][1], {'from': {'operator': '=', 'values': [12]}})
+        self.assertTrue(index.has_clone_on(2, date(2026, 2, 1)))
+        self.assertTrue(index.has_clone_on(3, date(2026, 3, 1)))
+
+
+class FakeWorkPackages:
+    """Answers work package and relation queries from memory, filtering them the way
+    the api does for the filters incremental sync sends.
+    """
+
+    def __init__(self):
+        self.work_packages: dict[int, dict] = {}
+        self.filters: list[list[dict]] = []
+        self.relation_queries = 0
+
+    def add(self, id: int, template: int | None=None, is_open: bool=True, updated: bool=True):
+        self.work_packages[id] = {'template': template, 'open': is_open, 'updated': updated}
+
+    def page(self, filters: list[dict]) -> dict:
+        self.filters.append(filters)
+        found = []
+        for id, wp in self.work_packages.items():
+            matches = True
+            for f in filters:
+                (key, value), = f.items()
+                if key == 'status_id':
+                    matches &= wp['open'] == (value['operator'] == 'o')
+                elif key == 'duplicates':
+                    matches &= wp['template'] in value['values']
+                elif key == 'project_id':
+                    matches &= wp['template'] is None
+                elif key == 'updatedAt':
+                    matches &= wp['updated']
+            if matches:
+                found.append(work_package_data(id, 1 if wp['open'] else 2))
+        return page_of(*found)
+
+    async def query_work_packages(self, *args, filters=None, **kwargs):
+        return self.page(filters)
+
+    async def iter_work_packages(self, *args, filters=None, **kwargs):
+        yield self.page(filters)
+
+    async def iter_work_package_relations(self, *args, filters=None, **kwargs):
+        self.relation_queries += 1
+        ids = next(f['from']['values'] for f in filters if 'from' in f)
+        yield page_of(*[relation_data(i, self.work_packages[i]['template']) for i in ids])
+
+    def settle(self):
+        for wp in self.work_packages.values():
+            wp['updated'] = False
+
+
+class TestSyncIncremental(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.config = com.APIConfig.from_env().model_copy(update={
+            'incremental_sync': True, 'snapshot_path': str(Path(self.tmp.name) / 'snapshot.sqlite3')
+        })
+        self.server = FakeWorkPackages()
+        self.schemas = [MagicMock(project_id=1, type_id=1)]
+
+    def tearDown(self):
+        get_sync_snapshot(self.config).close()
+        self.tmp.cleanup()
+
+    async def sync(self, dry_run: bool=False):
+        with patch('recurring.com.query_work_packages', self.server.query_work_packages), \
+             patch('recurring.com.iter_work_packages', self.server.iter_work_packages), \
+             patch('recurring.com.iter_work_package_relations', self.server.iter_work_package_relations):
+            return await sync_incremental(self.schemas, self.config, dry_run)
+
+    async def test_deltas_are_merged_into_the_previous_sync(self):
+        """Tests that a delta drops closed templates, resolves new clones through their
+        relations, fetches every clone of a template that newly came into scope and
+        overlaps the previous watermark.
+        """
+        self.server.add(1)
+        self.server.add(3)
+        self.server.add(10, template=1)
+        templates, index = await self.sync()
+        self.assertEqual([t.id for t in templates], [1, 3])
+        self.assertEqual([c.id for c in index.open_clones_of(1)], [10])
+        snapshot = get_sync_snapshot(self.config)
+        watermark = datetime.fromisoformat(snapshot.get_state('watermark'))
+        full_sync = snapshot.get_state('full_sync')
+
+        self.server.settle()
+        self.server.add(2)
+        self.server.add(20, template=2, updated=False)
+        self.server.add(3, is_open=False)
+        self.server.add(10, template=1, is_open=False)
+        self.server.add(11, template=1)
+        self.server.filters.clear()
+        templates, index = await self.sync()
+        self.assertEqual([t.id for t in templates], [1, 2])
+        self.assertEqual([c.id for c in index.open_clones_of(1)], [11])
+        self.assertEqual([c.id for c in index.open_clones_of(2)], [20])
+        since = (watermark - timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.assertIn({'updatedAt': {'operator': '<>d', 'values': [since, '']}}, self.server.filters[0])
+        self.assertEqual(snapshot.get_state('full_sync'), full_sync)
+
+    async def test_dry_runs_leave_the_snapshot_alone(self):
+        """Tests that a dry run merges the delta without storing it or moving the
+        watermark, so the next real run still sees the same changes.
+        """
+        self.server.add(1)
+        await self.sync()
+        snapshot = get_sync_snapshot(self.config)
+        watermark = snapshot.get_state('watermark')
+        self.server.settle()
+        self.server.add(2)
+        templates, _ = await self.sync(dry_run=True)
+        self.assertEqual([t.id for t in templates], [1, 2])
+        self.assertEqual([t['id'] for t in snapshot.load_templates()], [1])
+        self.assertEqual(snapshot.get_state('watermark'), watermark)
+
+    async def test_full_sync_runs_after_the_resync_interval(self):
+        """Tests that a template deleted without an update, which no delta can see,
+        is dropped once the full resync interval has passed.
+        """
+        self.server.add(1)
+        self.server.add(2)
+        await self.sync()
+        self.server.settle()
+        del self.server.work_packages[2]
+        templates, _ = await self.sync()
+        self.assertEqual([t.id for t in templates], [1, 2])
+
+        snapshot = get_sync_snapshot(self.config)
+        snapshot.set_state('full_sync', (datetime.now(timezone.utc) - timedelta(days=2)).isoformat())
+        relation_queries = self.server.relation_queries
+        templates, _ = await self.sync()
+        self.assertEqual([t.id for t in templates], [1])
+        self.assertEqual(self.server.relation_queries, relation_queries)
+
+
+class TestHandleClosedClone(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.open_clones = []
+        async def iter_work_packages(*args, filters=None, **kwargs):
+            yield page_of(*self.open_clones)
+        async def iter_work_package_relations(*args, **kwargs):
+            yield page_of(*[relation_data(c['id'], 1) for c in self.open_clones])
+        template = {**work_package_data(1), 'customField5': 7}
+        template['_links']['customField4'] = {'title': 'Fixed Delay'}
+        fields = {'Auto Scheduling Algorithm': 'customField4', 'Interval/Day Of Month': 'customField5'}
+        self.create_clone = AsyncMock()
+        self.patches = [
+            patch.dict(WorkPackageSchema.custom_field_name_map, fields),
+            patch('recurring.com.query_work_package_relations', new_callable=AsyncMock, return_value=page_of(relation_data(10, 1))),
+            patch('recurring.com.query_work_packages', new_callable=AsyncMock, return_value=page_of(template)),
+            patch('recurring.com.iter_work_packages', iter_work_packages),
+            patch('recurring.com.iter_work_package_relations', iter_work_package_relations),
+            patch('recurring.query_scheduling_schemas', new_callable=AsyncMock, return_value=[]),
+            patch('recurring.ProjectIndex.build', new_callable=AsyncMock, return_value=ProjectIndex()),
+            patch.object(WorkPackageCloneInfo, 'create_clone', self.create_clone),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+
+    async def test_next_clone_waits_for_the_fixed_delay_lock(self):
+        """Tests that a closed clone schedules its Fixed Delay template only once the
+        polling pass holding the lock has finished.
+        """
+        lock = asyncio.Lock()
+        await lock.acquire()
+        task = asyncio.create_task(handle_closed_clone(10, lock=lock))
+        await asyncio.sleep(0.01)
+        self.create_clone.assert_not_awaited()
+        lock.release()
+        await asyncio.wait_for(task, timeout=5)
+        self.create_clone.assert_awaited_once()
+
+    async def test_templates_with_another_open_clone_are_skipped(self):
+        self.open_clones = [work_package_data(11)]
+        await handle_closed_clone(10)
+        self.create_clone.assert_not_awaited()
+
+    async def test_new_templates_get_their_first_clone(self):
+        """Tests that a created event for a Fixed Delay template clones it right
+        away, limited to the projects and types of the scheduling schemas.
+        """
+        await handle_webhook_event('work_package:created', 1)
+        self.create_clone.assert_awaited_once()
+        filters = com.query_work_packages.await_args.kwargs['filters']
+        self.assertIn({'id': {'operator': '=', 'values': [1]}}, filters)
+        com.query_work_package_relations.assert_not_awaited()
+
+
+class TestCreateClone(unittest.IsolatedAsyncioTestCase):
+
+    async def test_clones_are_only_stamped_when_the_schema_has_both_fields(self):
+        """Tests that a target project whose schema lacks one of the provenance
+        fields gets clones without either of them.
+        """
+        data = work_package_data(1)
+        data['_links']['Target Project'] = {'href': '/api/v3/projects/1'}
+        data['_links']['type'] = {'href': '/api/v3/types/1'}
+        info = WorkPackageCloneInfo(template=WorkPackage(**data), modifications={})
+        projects = ProjectIndex(by_id={1: Project(id=1, active=True, name='Main')})
+        config = com.APIConfig.from_env().model_copy(update={'provenance_fields': True})
+        fields = {'Source Template': 'customField1', 'Scheduled Occurrence': 'customField2'}
+        schema = WorkPackageSchema(**{'customField1': {'name': 'Source Template'}, '_links': {'self': {'href': 'api/v3/schemas/1-1'}}})
+        with patch.dict(WorkPackageSchema.custom_field_name_map, fields), \
+             patch('recurring.WorkPackageSchema.query_work_package_schema', new_callable=AsyncMock, return_value=schema), \
+             patch('recurring.com.create_work_package', new_callable=AsyncMock, return_value=work_package_data(10)) as create, \
+             patch('recurring.com.create_relation', new_callable=AsyncMock):
+            await info.create_clone(projects, config)
+        payload = create.await_args.args[1]
+        self.assertNotIn('customField1', payload)
+        self.assertNotIn('customField2', payload)
+
+
+class TestProjectIndex(unittest.IsolatedAsyncioTestCase):
+
+    async def test_target_projects_are_resolved_by_href_then_title(self):
+        """Tests that projects are resolved by the id in the link when there is one
+        and that ambiguous titles are rejected.
+        """
+        projects = [
+            Project(id=1, active=True, name='Maintenance'),
+            Project(id=2, active=True, name='Maintenance'),
+            Project(id=3, active=True, name='Grounds'),
+        ]
+        with patch('recurring.Project.query_projects', new_callable=AsyncMock, return_value=projects):
+            index = await ProjectIndex.build()
+        self.assertEqual(index.resolve({'href': '/api/v3/projects/2', 'title': 'Maintenance'}).id, 2)
+        self.assertEqual(index.resolve({'href': None, 'title': 'Grounds'}).id, 3)
+        self.assertEqual(index.resolve({'href': '/openproject/api/v3/projects/3', 'title': 'Other'}).id, 3)
+        with self.assertRaises(ValueError):
+            index.resolve({'href': None, 'title': 'Maintenance'})
+        with self.assertRaises(ValueError):
+            index.resolve({'href': '/api/v3/projects/4'})
+
+
+class TestWeatherConditions(unittest.TestCase):
+
+    def test_conditions_are_evaluated_within_each_horizon(self):
+        """Tests that each template only sees the forecast within its own horizon
+        and that missing values and empty horizons never trigger.
+        """
+        def template(id: int, days: int, conditions: str) -> WorkPackage:
+            return WorkPackage(**work_package_data(id), **{'Interval/Day Of Month': days, 'Weather Conditions': conditions})
+        minutely_15 = {
+            'time': ['2026-01-01T00:00'] * 200,
+            'precipitation': [None] * 10 + [5.0] * 90 + [50.0] * 100,
+            'wind_gusts_10m': [None] * 200,
+        }
+        templates = [
+            template(1, 1, '{"precipitation": 20}'),
+            template(2, 2, '{"precipitation": 20}'),
+            template(3, 0, '{"precipitation": 1}'),
+            template(4, 2, '{"wind_gusts_10m": 1}'),
+            template(5, 1, '{"precipitation": 4, "wind_gusts_10m": 100}'),
+        ]
+        detected = evaluate_weather_conditions(templates, forecast_prefix_maxima(minutely_15))
+        self.assertEqual(detected.tolist(), [False, True, False, False, True])
+
+
+class TestWeatherForecast(unittest.IsolatedAsyncioTestCase):
+
+    async def test_failed_cells_only_skip_their_own_templates(self):
+        """Tests that a forecast that fails for one grid cell, here because the
+        horizon is too long, doesn't stop the templates of other cells.
+        """
+        def template(id: int, days: int, conditions: str) -> WorkPackage:
+            return WorkPackage(**work_package_data(id), **{
+                'Auto Scheduling Algorithm': {'title': 'Weather Forecast'}, 'Interval/Day Of Month': days,
+                'Weather Conditions': conditions, 'customField9': False,
+            })
+        async def query_forecast(num_days, config, latitude, longitude):
+            if num_days > 16:
+                raise ValueError('forecasts are only available 16 days out')
+            return {'minutely_15': {'precipitation': [5.0] * 200}}
+        templates = [
+            template(1, 1, '{"precipitation": 1, "latitude": 10, "longitude": 10}'),
+            template(2, 20, '{"precipitation": 1, "latitude": 50, "longitude": 50}'),
+        ]
+        with patch.dict(WorkPackageSchema.custom_field_name_map, {'Weather Detected Status': 'customField9'}), \
+             patch('recurring.com.query_forecast', query_forecast):
+            infos = await calculate_weather_dependent_clone_infos(templates, CloneIndex())
+        self.assertEqual([si.clone_info.template.id for si in infos], [1])
+        self.assertEqual(infos[0].template_info.modifications, {'customField9': True})
+
+    async def test_cancelled_forecasts_are_not_skipped(self):
+        async def query_forecast(num_days, config, latitude, longitude):
+            raise asyncio.CancelledError()
+        template = WorkPackage(**work_package_data(1), **{
+            'Auto Scheduling Algorithm': {'title': 'Weather Forecast'}, 'Interval/Day Of Month': 1,
+            'Weather Conditions': '{"precipitation": 1, "latitude": 10, "longitude": 10}',
+        })
+        with patch('recurring.com.query_forecast', query_forecast):
+            with self.assertRaises(asyncio.CancelledError):
+                await calculate_weather_dependent_clone_infos([template], CloneIndex())
+
+
+class TestDueDates(unittest.TestCase):
+
+    def test_due_dates_follow_the_next_occurrence(self):
+        """Tests that interval and day of month templates are due on their next
+        occurrence while day of year templates are due on new year's day.
+        """
+        today = date(2026, 5, 10)
+        def template(algorithm: str) -> WorkPackage:
+            return WorkPackage(**{**work_package_data(1), 'Auto Scheduling Algorithm': {'title': algorithm}})
+        self.assertEqual(calculate_due_date(template('Fixed Interval'), date(2026, 5, 17), today), date(2026, 5, 17))
+        self.assertEqual(calculate_due_date(template('Fixed Day Of Month'), date(2026, 6, 1), today), date(2026, 6, 1))
+        self.assertEqual(calculate_due_date(template('Fixed Day Of Year'), date(2026, 3, 1), today), date(2027, 1, 1))
+        self.assertIsNone(calculate_due_date(template('Weather Forecast'), today, today))
+
+
+class TestDueIndexInvalidation(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.index = DueIndex(Path(self.tmp.name) / 'due.sqlite3')
+        later = date.today() + timedelta(days=30)
+        self.index.schedule([(1, later, None), (2, later, None), (3, later, None)])
+        self.index.set_state('checked', datetime.now(timezone.utc).isoformat())
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    async def test_templates_with_changed_clones_are_due(self):
+        """Tests that a template whose clone changed since the last check is
+        dropped from the due index and scheduled again, while the others
+        stay skipped.
+        """
+        queried_filters = []
+        async def iter_work_packages(*args, filters=None, **kwargs):
+            queried_filters.append(filters)
+            yield page_of(work_package_data(10, 2))
+        async def iter_work_package_relations(*args, **kwargs):
+            yield page_of(relation_data(10, 2))
+        with patch('recurring.com.iter_work_packages', iter_work_packages), \
+             patch('recurring.com.iter_work_package_relations', iter_work_package_relations):
+            changed = await query_changed_due_templates(self.index, dry_run=True)
+            self.assertEqual(changed, {2})
+            self.assertEqual(set(self.index.not_due(date.today())), {1, 2, 3})
+            await query_changed_due_templates(self.index)
+        self.assertEqual(queried_filters[0][0], {'duplicates': {'operator': '=', 'values': [1, 2, 3]}})
+        self.assertEqual(set(self.index.not_due(date.today())), {1, 3})
+        templates = [WorkPackage(**work_package_data(i)) for i in (1, 2, 3)]
+        self.assertEqual([t.id for t in skip_templates_not_due(self.index, templates, changed)], [2])
+
+
+class TestCacheAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def test_unhashable_arguments_are_cached_exactly(self):
+        """Tests that dict filters can be used as keys and that values which
+        hash alike, such as 1 and True, are kept apart.
+        """
+        mock = AsyncMock(side_effect=lambda value: value)
+        cached = cache_async(mock)
+        self.assertEqual(await cached([{'id': {'operator': '=', 'values': [1]}}]), [{'id': {'operator': '=', 'values': [1]}}])
+        await cached([{'id': {'operator': '=', 'values': [1]}}])
+        self.assertIs(await cached(1), 1)
+        self.assertIs(await cached(True), True)
+        self.assertEqual(mock.await_count, 3)
+        self.assertEqual(cached.cache_info()['hits'], 1)
+
+    async def test_concurrent_misses_are_coalesced(self):
+        """Tests that concurrent calls with the same arguments only await the
+        wrapped function once.
+        """
+        async def query(project_id):
+            await asyncio.sleep(0.01)
+            return project_id
+        mock = AsyncMock(side_effect=query)
+        cached = cache_async(mock)
+        results = await asyncio.gather(*[cached(1) for _ in range(5)])
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(mock.await_count, 1)
+        self.assertEqual(cached.cache_info()['coalesced'], 4)
+
+    async def test_entries_are_evicted_and_expire(self):
+        mock = AsyncMock(side_effect=lambda value: value)
+        cached = cache_async(maxsize=2)(mock)
+        for value in (1, 2, 3, 1):
+            await cached(value)
+        self.assertEqual(mock.await_count, 4)
+        self.assertEqual(cached.cache_info()['evictions'], 2)
+        expiring = cache_async(ttl=-1)(mock)
+        await expiring(1)
+        await expiring(1)
+        self.assertEqual(mock.await_count, 6)
+
+
+class TestPipeline(unittest.IsolatedAsyncioTestCase):
+
+    async def test_incremental_templates_are_limited_to_the_algorithms(self):
+        """Tests that templates from the sync snapshot are filtered by algorithm the
+        same way templates from a full query are.
+        """
+        def template(id: int, algorithm: str) -> WorkPackage:
+            return WorkPackage(**{**work_package_data(id), 'Auto Scheduling Algorithm': {'title': algorithm}})
+        templates = [template(1, 'Fixed Interval'), template(2, 'Fixed Delay')]
+        seen = []
+        async def calculator(templates, clone_index):
+            seen.extend(t.id for t in templates)
+            return []
+        config = com.APIConfig.from_env().model_copy(update={'due_index': False})
+        for incremental in (True, False):
+            seen.clear()
+            with self.subTest(incremental=incremental), \
+                 patch('recurring.query_scheduling_schemas', new_callable=AsyncMock, return_value=[]), \
+                 patch('recurring.sync_incremental', new_callable=AsyncMock, return_value=(templates, CloneIndex())), \
+                 patch('recurring.query_templates', new_callable=AsyncMock, return_value=templates), \
+                 patch('recurring.CloneIndex.build', new_callable=AsyncMock, return_value=CloneIndex()), \
+                 patch.dict('recurring.CALCULATORS', {'Fixed Interval': calculator, 'Fixed Delay': calculator}, clear=True):
+                await calculate_scheduling_infos(config.model_copy(update={'incremental_sync': incremental}), {'Fixed Interval'})
+                self.assertEqual(seen, [1])
+
+    async def test_results_are_applied_before_slow_algorithms_finish(self):
+        """Tests that scheduling infos are applied while other algorithms are
+        still running, and that a failure doesn't stop the rest from applying.
+        """
+        applied = asyncio.Event()
+        fast_info = MagicMock(apply=AsyncMock(side_effect=lambda *args: applied.set()))
+        failing_info = MagicMock(apply=AsyncMock(side_effect=RuntimeError('boom')))
+        slow_info = MagicMock(apply=AsyncMock())
+
+        async def fast(templates, clone_index):
+            return [failing_info, fast_info]
+        async def slow(templates, clone_index):
+            await applied.wait()
+            return [slow_info]
+
+        with patch('recurring.ProjectIndex.build', new_callable=AsyncMock, return_value=ProjectIndex()), \
+             patch('recurring.query_scheduling_schemas', new_callable=AsyncMock), \
+             patch('recurring.query_templates', new_callable=AsyncMock, return_value=[]), \
+             patch.dict('recurring.CALCULATORS', {'Fast': fast, 'Slow': slow}, clear=True):
+            with self.assertRaises(RuntimeError):
+                await asyncio.wait_for(run_once(), timeout=5)
+        slow_info.apply.assert_awaited_once()
+
+    async def test_failed_clones_leave_the_template_alone(self):
+        """Tests that a clone that fails to be created is reported and that the
+        template isn't updated, so the clone is retried by the next run.
+        """
+        data = work_package_data(1)
+        data['_links']['Target Project'] = {'href': '/api/v3/projects/1'}
+        data['_links']['type'] = {'href': '/api/v3/types/1'}
+        template = WorkPackage(**data)
+        projects = ProjectIndex(by_id={1: Project(id=1, active=True, name='Main')})
+        info = WorkPackageSchedulingInfo(
+            clone_info=WorkPackageCloneInfo(template=template, modifications={}),
+            template_info=WorkPackageTemplateInfo(template=template, modifications={})
+        )
+        async def calculator(templates, clone_index):
+            return [info]
+
+        with patch('recurring.ProjectIndex.build', new_callable=AsyncMock, return_value=projects), \
+             patch('recurring.query_scheduling_schemas', new_callable=AsyncMock), \
+             patch('recurring.query_templates', new_callable=AsyncMock, return_value=[]), \
+             patch('recurring.WorkPackageSchema.query_work_package_schema', new_callable=AsyncMock, return_value=MagicMock()), \
+             patch('recurring.com.create_work_package', new_callable=AsyncMock, side_effect=RuntimeError('boom')), \
+             patch('recurring.com.update_work_package', new_callable=AsyncMock) as update, \
+             patch.dict('recurring.CALCULATORS', {'Weather Forecast': calculator}, clear=True):
+            with self.assertRaises(RuntimeError):
+                await asyncio.wait_for(run_once(), timeout=5)
+        update.assert_not_awaited()
+
+    async def test_failed_algorithms_cancel_the_others(self):
+        """Tests that an algorithm that raises cancels the algorithms still running
+        instead of leaving them blocked once the workers are gone.
+        """
+        cancelled = asyncio.Event()
+        async def failing(templates, clone_index):
+            raise RuntimeError('boom')
+        async def blocked(templates, clone_index):
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with patch('recurring.ProjectIndex.build', new_callable=AsyncMock, return_value=ProjectIndex()), \
+             patch('recurring.query_scheduling_schemas', new_callable=AsyncMock), \
+             patch('recurring.query_templates', new_callable=AsyncMock, return_value=[]), \
+             patch.dict('recurring.CALCULATORS', {'Failing': failing, 'Blocked': blocked}, clear=True):
+            with self.assertRaises(ExceptionGroup):
+                await asyncio.wait_for(run_once(), timeout=5)
+        self.assertTrue(cancelled.is_set())
+
+    async def test_profiled_runs_report_every_phase(self):
+        """Tests that a profiled run reports the timing of the run and of each
+        algorithm in a json serializable report.
+        """
+        async def calculator(templates, clone_index):
+            return []
+
+        telemetry.start_profile()
+        try:
+            with patch('recurring.ProjectIndex.build', new_callable=AsyncMock, return_value=ProjectIndex()), \
+                 patch('recurring.query_scheduling_schemas', new_callable=AsyncMock), \
+                 patch('recurring.query_templates', new_callable=AsyncMock, return_value=[]), \
+                 patch.dict('recurring.CALCULATORS', {'Fixed Delay': calculator}, clear=True):
+                await run_once()
+        finally:
+            phases = telemetry.stop_profile()
+        report = json.loads(json.dumps(build_profile_report(phases, 1.0)))
+        self.assertEqual(report['phases']['scheduling run']['count'], 1)
+        self.assertIn('calculate Fixed Delay', report['phases'])
+        self.assertIn('requests', report['http'])
+
+    async def test_plans_are_read_only_and_attribute_reads(self):
+        """Tests that a plan lists the clones and template updates of a real
+        calculator without applying them, and attributes its reads to it.
+        """
+        methods = []
+        async def forecast(request: web.Request):
+            methods.append(request.method)
+            return web.json_response({'minutely_15': {'precipitation': [5.0] * 200}})
+        app = web.Application()
+        app.router.add_route('*', '/v1/forecast', forecast)
+        server = TestServer(app)
+        await server.start_server()
+        self.addAsyncCleanup(server.close)
+        self.addAsyncCleanup(com.close_clients)
+        config = com.APIConfig.from_env().model_copy(update={
+            'weather_url': f'http://{server.host}:{server.port}/v1/forecast', 'metadata_cache_path': ''
+        })
+
+        data = work_package_data(1)
+        data['_links']['Target Project'] = {'href': '/api/v3/projects/1'}
+        template = WorkPackage(**data, **{
+            'Auto Scheduling Algorithm': {'title': 'Weather Forecast'}, 'Interval/Day Of Month': 1,
+            'Weather Conditions': '{"precipitation": 1, "latitude": 10, "longitude": 10}', 'customField9': False,
+        })
+        projects = ProjectIndex(by_id={1: Project(id=1, active=True, name='Main')})
+        calculator = functools.partial(calculate_weather_dependent_clone_infos, config=config)
+        with patch.dict(WorkPackageSchema.custom_field_name_map, {'Weather Detected Status': 'customField9'}), \
+             patch('recurring.ProjectIndex.build', new_callable=AsyncMock, return_value=projects), \
+             patch('recurring.query_scheduling_schemas', new_callable=AsyncMock), \
+             patch('recurring.query_templates', new_callable=AsyncMock, return_value=[template]), \
+             patch('recurring.CloneIndex.build', new_callable=AsyncMock, return_value=CloneIndex()), \
+             patch('recurring.WorkPackageSchedulingInfo.apply', new_callable=AsyncMock) as apply, \
+             patch.dict('recurring.CALCULATORS', {'Weather Forecast': calculator}, clear=True):
+            plan = json.loads(json.dumps(await plan_once(config=config), default=str))
+        apply.assert_not_awaited()
+        self.assertEqual(methods, ['GET'])
+        self.assertFalse(com.get_client(config).read_only)
+        self.assertEqual(plan['clones'][0]['target_project'], {'id': 1, 'name': 'Main'})
+        self.assertEqual(plan['template_updates'], [{'template_id': 1, 'modifications': {'customField9': True}}])
+        reads = plan['reads']['Weather Forecast']
+        self.assertEqual(reads['requests'], 1)
+        self.assertGreater(reads['bytes_received'], 0)
+
+    async def test_read_only_clients_refuse_writes(self):
+        client = com.APIClient(com.APIConfig.from_env())
+        client.read_only = True
+        with self.assertRaises(RuntimeError):
+            await client.request('POST', 'http://foo.local/api/v3/work_packages')
+
+class TestDaemon(unittest.IsolatedAsyncioTestCase):
+
+    async def test_passes_repeat_until_a_signal_stops_them(self):
+        """Tests that passes repeat on a jittered interval, that Fixed Delay is left
+        to the webhooks between reconciliations and that a SIGTERM closes the
+        receiver and the clients.
+        """
+        config = com.APIConfig.from_env().model_copy(update={
+            'daemon_interval': 0, 'daemon_jitter': 5, 'webhook_port': 0, 'webhook_reconcile_interval': 3600
+        })
+        passes = []
+        async def run_once(algorithms, config):
+            passes.append(algorithms)
+            if len(passes) == 2:
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        receiver = MagicMock(start=AsyncMock(), stop=AsyncMock())
+        with patch('recurring.run_once', run_once), \
+             patch('recurring.WebhookReceiver', return_value=receiver), \
+             patch('recurring.random.uniform', return_value=-5) as uniform, \
+             patch('recurring.com.close_clients', new_callable=AsyncMock) as close_clients:
+            await asyncio.wait_for(async_daemon(config), timeout=5)
+        self.assertEqual(passes, [None, set(CALCULATORS) - {'Fixed Delay'}])
+        uniform.assert_called_with(-5, 5)
+        receiver.start.assert_awaited_once()
+        receiver.stop.assert_awaited_once()
+        close_clients.assert_awaited_once()
+
+
+class TestLogging(unittest.TestCase):
+
+    def test_logs_are_queued_and_rotated(self):
+        """Tests that records reach the log file in the format the collector parses
+        and that the file is rotated once it reaches its max size.
+        """
+        root = logging.getLogger()
+        handlers, level = list(root.handlers), root.level
+        config = com.APIConfig.from_env().model_copy(update={'log_max_bytes': 1024, 'log_backups': 2})
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'app.log'
+            listener = setup_logging(config, path)
+            try:
+                for i in range(100):
+                    logging.debug('scheduling pass %d', i)
+            finally:
+                listener.stop()
+                root.handlers, root.level = handlers, level
+            lines = path.read_text().splitlines()
+            self.assertTrue(Path(f'{path}.1').exists())
+            self.assertFalse(Path(f'{path}.3').exists())
+        pattern = r'^(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (?P<level>[A-Z]+) - (?P<msg>.*)$'
+        self.assertRegex(lines[-1], pattern)
+        self.assertTrue(lines[-1].endswith('scheduling pass 99'))
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2, failfast=False)
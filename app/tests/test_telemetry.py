@@ -0,0 +1,50 @@
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import common as com
+import telemetry
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def tearDown(self):
+        telemetry.shutdown()
+
+    def test_disabled_telemetry_is_a_no_op(self):
+        config = com.APIConfig.from_env().model_copy(update={'telemetry': False})
+        self.assertFalse(telemetry.setup(config))
+        with telemetry.timed('run', 'scheduler.run.duration') as span:
+            telemetry.count('scheduler.clones.created')
+        self.assertIsNone(span)
+
+    def test_endpoints_are_recorded_without_ids(self):
+        url = 'http://foo.local/api/v3/work_packages/schemas/1-2'
+        self.assertEqual(telemetry.endpoint_of(url), '/api/v3/work_packages/schemas/{id}')
+        self.assertEqual(telemetry.endpoint_of('http://foo.local/api/v3/work_packages/12/relations'), '/api/v3/work_packages/{id}/relations')
+
+    @unittest.skipUnless(telemetry.OPENTELEMETRY_AVAILABLE, 'opentelemetry-sdk is not installed')
+    def test_falls_back_to_a_local_file(self):
+        """Tests that spans and metrics are written to the telemetry file when no
+        collector endpoint is configured.
+        """
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'telemetry.jsonl'
+            config = com.APIConfig.from_env().model_copy(update={
+                'telemetry': True, 'otel_exporter_otlp_endpoint': None, 'telemetry_path': str(path)
+            })
+            self.assertTrue(telemetry.setup(config))
+            with telemetry.timed('calculate Fixed Delay', 'scheduler.algorithm.duration', algorithm='Fixed Delay'):
+                telemetry.count('scheduler.clones.created', algorithm='Fixed Delay')
+            telemetry.shutdown()
+            records = [json.loads(line) for line in path.read_text().splitlines()]
+        spans = [r for r in records if 'name' in r]
+        self.assertEqual(spans[0]['name'], 'calculate Fixed Delay')
+        metrics = [m['name'] for r in records if 'resource_metrics' in r
+                   for rm in r['resource_metrics'] for sm in rm['scope_metrics'] for m in sm['metrics']]
+        self.assertIn('scheduler.clones.created', metrics)
+        self.assertIn('scheduler.algorithm.duration', metrics)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, failfast=False)
@@ -0,0 +1,69 @@
+import hmac
+import json
+import hashlib
+import unittest
+import aiohttp
+from unittest.mock import AsyncMock
+import common as com
+from webhook import WebhookReceiver
+
+
+def work_package_event(id: int, is_closed: bool, action: str='work_package:updated') -> dict:
+    return {
+        'action': action,
+        'work_package': {
+            'id': id,
+            '_embedded': {'status': {'isClosed': is_closed}},
+        }
+    }
+
+
+class TestWebhookReceiver(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.handler = AsyncMock()
+        config = com.APIConfig(api_key='1234', host='foo.local', webhook_host='127.0.0.1', webhook_port=0, webhook_secret='secret')
+        self.receiver = WebhookReceiver(self.handler, config)
+        await self.receiver.start()
+        self.url = f'http://127.0.0.1:{self.receiver.port}{config.webhook_path}'
+        self.session = aiohttp.ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.receiver.stop()
+
+    async def post(self, payload: dict, secret: str='secret') -> int:
+        """Posts a payload the way OpenProject does, signed with the secret.
+        """
+        body = json.dumps(payload).encode()
+        signature = 'sha1=' + hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+        headers = {'Content-Type': 'application/json', 'X-OP-Signature': signature}
+        async with self.session.post(self.url, data=body, headers=headers) as response:
+            return response.status
+
+    async def test_closed_work_packages_are_handled(self):
+        self.assertEqual(await self.post(work_package_event(10, True)), 202)
+        self.assertEqual(await self.post(work_package_event(11, False)), 202)
+        await self.receiver.join()
+        self.handler.assert_awaited_once_with('work_package:updated', 10)
+
+    async def test_created_work_packages_are_handled(self):
+        self.assertEqual(await self.post(work_package_event(12, False, 'work_package:created')), 202)
+        await self.receiver.join()
+        self.handler.assert_awaited_once_with('work_package:created', 12)
+
+    async def test_malformed_payloads_are_rejected(self):
+        self.assertEqual(await self.post({'action': 'work_package:updated', 'work_package': []}), 400)
+        self.assertEqual(await self.post({'action': 'work_package:updated', 'work_package': {'id': 'x'}}), 400)
+        self.assertEqual(await self.post({'action': 'work_package:updated', 'work_package': {'id': 1, '_embedded': 'x'}}), 400)
+        await self.receiver.join()
+        self.handler.assert_not_awaited()
+
+    async def test_invalid_signatures_are_rejected(self):
+        self.assertEqual(await self.post(work_package_event(10, True), secret='wrong'), 401)
+        await self.receiver.join()
+        self.handler.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, failfast=False)
@@ -0,0 +1,95 @@
+import hmac
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Optional
+from aiohttp import web
+import common as com
+
+
+# ————————————————————————— Models —————————————————————————
+
+class WebhookReceiver:
+    """Local http receiver for OpenProject work package webhooks. Created work packages
+    and updates to work packages that are now closed are queued and passed to the
+    handler with their action one at a time, so two events for the same clone can't
+    schedule the same template twice.
+    """
+
+    def __init__(self, handler: Callable[[str, int], Awaitable[None]], config: com.APIConfig=com.APIConfig.from_env()):
+        self.handler = handler
+        self.config = config
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def port(self) -> int:
+        """Returns the port the receiver is bound to, useful when started on port 0.
+        """
+        return self._runner.addresses[0][1]
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.config.webhook_path, self.receive)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.config.webhook_host, self.config.webhook_port)
+        # the queue has to exist before the first request can arrive
+        self._queue = asyncio.Queue()
+        await site.start()
+        self._worker = asyncio.create_task(self._work())
+        logging.info('Webhook receiver listening on %s:%d%s', self.config.webhook_host, self.port, self.config.webhook_path)
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def join(self):
+        """Waits until every queued event has been handled.
+        """
+        await self._queue.join()
+
+    def verify(self, body: bytes, signature: Optional[str]) -> bool:
+        """Checks the X-OP-Signature header against the configured secret. Every
+        request is accepted when no secret is configured.
+        """
+        if not self.config.webhook_secret:
+            return True
+        expected = 'sha1=' + hmac.new(self.config.webhook_secret.encode(), body, hashlib.sha1).hexdigest()
+        return (signature is not None) and hmac.compare_digest(expected, signature)
+
+    async def receive(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if not self.verify(body, request.headers.get('X-OP-Signature')):
+            logging.warning('Rejected webhook with an invalid signature')
+            return web.Response(status=401)
+        try:
+            payload: dict = await request.json()
+            action = payload['action']
+            work_package = payload['work_package']
+            status = work_package.get('_embedded', {}).get('status', {})
+            is_closed = status.get('isClosed')
+            work_package_id = int(work_package['id'])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return web.Response(status=400)
+
+        # updates to work packages that are known to still be open can't free up a template
+        if (action == 'work_package:created') or ((action == 'work_package:updated') and (is_closed is not False)):
+            logging.debug('Queued webhook %s for work package %d', action, work_package_id)
+            self._queue.put_nowait((action, work_package_id))
+        return web.Response(status=202)
+
+    async def _work(self):
+        while True:
+            action, work_package_id = await self._queue.get()
+            try:
+                await self.handler(action, work_package_id)
+            except Exception:
+                logging.exception('Failed to handle webhook %s for work package %d', action, work_package_id)
+            finally:
+                self._queue.task_done()